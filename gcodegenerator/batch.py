@@ -0,0 +1,250 @@
+"""
+画像フォルダ（またはグロブ）をまとめて絶対ステップ CSV にする。
+ウィンドウは出さない。main.py と同じ処理を画像ごとにプロセスプールで回す。
+
+使い方:
+    python batch.py photos/ -o out/
+    python batch.py "photos/*.jpg" -o out/ --params params.json -j 4
+
+params.json（省略可）:
+    {
+        "*":        {"face_strength": 40, "cloth_strength": 120},
+        "fri.jpg":  {"face_strength": 30, "curve_count": 90}
+    }
+    "*" は全画像の既定値、ファイル名のキーはその画像だけ上書きする。
+"""
+import argparse
+import csv
+import glob
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import cv2
+
+from camera.processor import load_image_from_file, extract_curve_list_headless
+from list2gcode.makegcode import mm_per_step
+from list2gcode.lutcache import load_lut_cached, kdtree_from_lut
+from list2gcode.processor import (
+    vectorize_curves,
+    sort_curves_tsp,
+    export_curve_csv,
+    generate_rotandscale_curves,
+    genrad_kdtree,
+    split_reachable_curves,
+    resample_by_joint_step,
+    sort_result_joint_tsp,
+    convert_result_to_steps
+)
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff"}
+
+# main.py と同じ既定値
+DEFAULT_PARAMS = {
+    # 線画
+    "face_strength": 40,
+    "cloth_strength": 120,
+    "curve_count": 70,
+    "extract_mode": "graph",
+    # 配置（ハガキ）
+    "rotate_deg": 90,
+    "box_w": 148,
+    "box_h": 100,
+    "offset_x": -148/2,
+    "offset_y": 40,
+    "decimal_digits": 3,
+    # 曲線マージ・簡略化（px）
+    "merge_tol": 3.0,
+    "simplify_tol": 0.5,
+    # IK
+    "microsteps": 1,
+    "grid_k": "auto",     # 格子 LUT の 1 マスの候補数（main.py の GRID_K）
+}
+
+
+# =========================================
+#  入力画像を集める
+# =========================================
+def collect_images(source):
+    """
+    source がフォルダなら直下の画像、そうでなければグロブとして展開する。
+    """
+    path = Path(source)
+    if path.is_dir():
+        files = [p for p in path.iterdir() if p.suffix.lower() in IMAGE_EXTS]
+    else:
+        files = [Path(p) for p in glob.glob(source)]
+        files = [p for p in files if p.suffix.lower() in IMAGE_EXTS]
+    return sorted(files)
+
+
+def load_params(path):
+    """params.json を読む。戻り値は (全体の既定値, ファイル名 → 上書き値)"""
+    if path is None:
+        return {}, {}
+
+    with open(path, encoding="utf-8") as f:
+        table = json.load(f)
+
+    common = table.pop("*", {})
+    for key in list(common) + [k for v in table.values() for k in v]:
+        if key not in DEFAULT_PARAMS:
+            raise ValueError(f"❌ 不明なパラメータ: {key}")
+    return common, table
+
+
+# =========================================
+#  1 画像分の処理（ワーカープロセス）
+# =========================================
+def process_image(image_path, out_dir, params):
+    """
+    画像 1 枚を main.py と同じ流れで処理し、CSV を out_dir に書く。
+    return: サマリー 1 行分の dict
+    """
+    # 並列に動かすので、OpenCV 内部のスレッドは増やさない
+    cv2.setNumThreads(1)
+
+    p = dict(DEFAULT_PARAMS, **params)
+    stem = Path(image_path).stem
+    steps_csv = out_dir / f"{stem}_steps.csv"
+    curves_csv = out_dir / f"{stem}_curves.csv"
+
+    timings = {}
+    t = time.perf_counter()
+
+    def lap(name):
+        nonlocal t
+        now = time.perf_counter()
+        timings[name] = now - t
+        t = now
+
+    img = load_image_from_file(image_path)
+    curve_list = extract_curve_list_headless(img,
+                                             face_strength=p["face_strength"],
+                                             cloth_strength=p["cloth_strength"],
+                                             curve_count=p["curve_count"],
+                                             mode=p["extract_mode"])
+    lap("extract")
+
+    merged_list = vectorize_curves(curve_list, merge_tol=p["merge_tol"],
+                                   simplify_tol=p["simplify_tol"])
+    sorted_list = sort_curves_tsp(merged_list)
+    final_curves = generate_rotandscale_curves(
+        sorted_list,
+        rotate_deg=p["rotate_deg"],
+        box_w=p["box_w"],
+        box_h=p["box_h"],
+        offset_x=p["offset_x"],
+        offset_y=p["offset_y"],
+        decimal_digits=p["decimal_digits"],
+        chaikin_tol_mm=mm_per_step(microsteps=p["microsteps"]) / 2
+    )
+    lap("layout")
+
+    lut = load_lut_cached(microsteps=p["microsteps"], k=p["grid_k"])
+    final_curves = split_reachable_curves(final_curves, lut=lut, microsteps=p["microsteps"])
+    final_curves = resample_by_joint_step(final_curves, microsteps=p["microsteps"], grid=lut)
+    result = genrad_kdtree(final_curves, lut=lut, microsteps=p["microsteps"])
+    result = sort_result_joint_tsp(result, microsteps=p["microsteps"])
+    lap("ik")
+
+    step_list = convert_result_to_steps(result, out_csv=str(steps_csv),
+                                        microsteps=p["microsteps"])
+    export_curve_csv(result, str(curves_csv))
+    lap("write")
+
+    return {
+        "image": str(image_path),
+        "status": "ok",
+        "curves": len(result),
+        "steps": len(step_list),
+        **{f"t_{k}": round(v, 3) for k, v in timings.items()},
+        "t_total": round(sum(timings.values()), 3),
+        "steps_csv": str(steps_csv),
+        "curves_csv": str(curves_csv),
+    }
+
+
+# =========================================
+#  まとめて実行
+# =========================================
+SUMMARY_FIELDS = ["image", "status", "curves", "steps",
+                  "t_extract", "t_layout", "t_ik", "t_write", "t_total",
+                  "steps_csv", "curves_csv", "error"]
+
+
+def run_batch(source, out_dir, params_path=None, workers=None):
+    """
+    source の全画像を処理し、out_dir/summary.csv に結果と処理時間を書く。
+    1 枚失敗しても他の画像は続ける。
+    return: サマリーの行リスト（入力順）
+    """
+    files = collect_images(source)
+    if not files:
+        raise FileNotFoundError(f"❌ 画像が見つかりません: {source}")
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    common, per_file = load_params(params_path)
+    params = {f: dict(common, **per_file.get(f.name, {})) for f in files}
+
+    # LUT キャッシュ（安全マップ込み）と KD-tree は、使う設定ごとに先に作っておく。
+    # ワーカーは読むだけなので、同じ LUT を全員が同時に作り始めることがない
+    for ms, grid_k in sorted({(p["microsteps"], p["grid_k"])
+                              for p in (dict(DEFAULT_PARAMS, **q) for q in params.values())},
+                             key=repr):
+        kdtree_from_lut(load_lut_cached(microsteps=ms, k=grid_k))
+        load_lut_cached(microsteps=ms)      # radcheck の安全マップは既定の k の LUT から引く
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(files)))
+
+    print(f"バッチ処理: {len(files)} 枚, {workers} プロセス → {out_dir}")
+    t0 = time.perf_counter()
+
+    # spawn だと main.py が子プロセスで再実行されるので、使えるなら fork（lutcache と同じ）
+    methods = multiprocessing.get_all_start_methods()
+    ctx = multiprocessing.get_context("fork" if "fork" in methods else None)
+
+    rows = {}
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        futures = {
+            pool.submit(process_image, f, out_dir, params[f]): f
+            for f in files
+        }
+        for fut in as_completed(futures):
+            f = futures[fut]
+            try:
+                row = fut.result()
+            except Exception as e:
+                row = {"image": str(f), "status": "error", "error": repr(e)}
+            rows[f] = row
+            print(f"  {row['status']:5s} {f.name}  {row.get('t_total', '-')} s")
+
+    rows = [rows[f] for f in files]
+
+    summary_csv = out_dir / "summary.csv"
+    with open(summary_csv, "w", newline="", encoding="utf-8") as fp:
+        writer = csv.DictWriter(fp, fieldnames=SUMMARY_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+    n_ok = sum(r["status"] == "ok" for r in rows)
+    print(f"完了: {n_ok}/{len(rows)} 枚 成功, {time.perf_counter() - t0:.1f} s → {summary_csv}")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="画像フォルダをまとめてステップ CSV に変換する")
+    parser.add_argument("source", help="画像フォルダ、またはグロブ（例: 'photos/*.jpg'）")
+    parser.add_argument("-o", "--out", default="batch_out", help="出力フォルダ")
+    parser.add_argument("--params", default=None, help="パラメータ JSON（'*' が既定値、ファイル名ごとに上書き）")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="プロセス数（既定: CPU 数）")
+    args = parser.parse_args()
+
+    run_batch(args.source, args.out, params_path=args.params, workers=args.workers)
@@ -8,6 +8,8 @@ BASE_DIR = Path(__file__).resolve().parent
 import cv2
 import numpy as np
 import subprocess
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components, depth_first_order, minimum_spanning_tree
 
 
 # 縦横比を調節
@@ -36,9 +38,9 @@ def resize_with_aspect(img, target_w, target_h):
 
 
 #フレームの縦横比を変更
-def crop_to_aspect(img, target_w, target_h):
+def center_crop_aspect(img, target_w, target_h):
     """
-    入力画像 img を target_w:target_h の縦横比に中央でクロップする
+    入力画像 img を target_w:target_h の縦横比に中央でクロップする（拡大縮小はしない、view を返す）
     """
     h, w = img.shape[:2]
     target_ratio = target_w / target_h
@@ -48,15 +50,20 @@ def crop_to_aspect(img, target_w, target_h):
     if src_ratio > target_ratio:
         new_w = int(h * target_ratio)
         x1 = (w - new_w) // 2
-        img_cropped = img[:, x1:x1 + new_w]
-    else:
-        # 縦が余る場合 → 縦をクロップ
-        new_h = int(w / target_ratio)
-        y1 = (h - new_h) // 2
-        img_cropped = img[y1:y1 + new_h, :]
+        return img[:, x1:x1 + new_w]
+
+    # 縦が余る場合 → 縦をクロップ
+    new_h = int(w / target_ratio)
+    y1 = (h - new_h) // 2
+    return img[y1:y1 + new_h, :]
 
+
+def crop_to_aspect(img, target_w, target_h):
+    """
+    入力画像 img を target_w:target_h の縦横比に中央でクロップし、target_w × target_h にする
+    """
     # 目的サイズに縮小（引き伸ばしではなく比率は維持済み）
-    return cv2.resize(img_cropped, (target_w, target_h))
+    return cv2.resize(center_crop_aspect(img, target_w, target_h), (target_w, target_h))
 
 # === 顔検出器 ===
 face_cascade = cv2.CascadeClassifier(str(BASE_DIR / "haarcascade_frontalface_default.xml"))
@@ -73,23 +80,487 @@ def detect_face_once(img):
     )
     return faces
 
+# === プレビュー用の軽い顔検出（縮小画像で検出 → 元の解像度へ戻す） ===
+def detect_face_small(small_gray, scale):
+    """
+    縮小済みのグレー画像で顔検出する（bilateralFilter も小さい d で済ませる）。
+    minSize は元の解像度で 60px 相当。
+    return: 縮小画像上の矩形 (N, 4)
+    """
+    smooth = cv2.bilateralFilter(small_gray, d=5, sigmaColor=75, sigmaSpace=75)
+    min_px = max(12, int(60 / scale))
+    faces = face_cascade.detectMultiScale(
+        smooth,
+        scaleFactor=1.1,
+        minNeighbors=5,
+        minSize=(min_px, min_px)
+    )
+    return np.asarray(faces, dtype=int).reshape(-1, 4)
+
+
+def track_faces(prev_gray, gray, faces, margin=0.5, min_score=0.5):
+    """
+    前フレームの矩形を、今のフレームで matchTemplate により追跡する（縮小画像上）。
+    矩形の周り margin 倍の範囲だけを探す。一致度が min_score 未満の矩形は捨てる。
+    """
+    H, W = gray.shape[:2]
+    tracked = []
+
+    for (x, y, w, h) in faces:
+        tmpl = prev_gray[y:y+h, x:x+w]
+        if tmpl.shape[0] < 4 or tmpl.shape[1] < 4:
+            continue
+
+        mx, my = int(w * margin), int(h * margin)
+        x0, y0 = max(0, x - mx), max(0, y - my)
+        x1, y1 = min(W, x + w + mx), min(H, y + h + my)
+        window = gray[y0:y1, x0:x1]
+        if window.shape[0] < h or window.shape[1] < w:
+            continue
+
+        res = cv2.matchTemplate(window, tmpl, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (bx, by) = cv2.minMaxLoc(res)
+        if score >= min_score:
+            tracked.append((x0 + bx, y0 + by, w, h))
+
+    return np.asarray(tracked, dtype=int).reshape(-1, 4)
+
+
 # === 線画生成 (顔と服/背景で独立調整) ===
-def line_drawing_image(img, face_strength, cloth_strength, faces):
+# 調整ループで変わった層だけ作り直せるよう、段階ごとに分けてある
+def smooth_image(img):
     gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    smooth = cv2.bilateralFilter(gray, d=9, sigmaColor=75, sigmaSpace=75)
+    return cv2.bilateralFilter(gray, d=9, sigmaColor=75, sigmaSpace=75)
 
-    edges = cv2.Canny(smooth, cloth_strength, cloth_strength * 2)
 
-    for (x, y, w, h) in faces:
-        roi = smooth[y:y+h, x:x+w]
-        face_edges = cv2.Canny(roi, face_strength, face_strength * 2)
-        edges[y:y+h, x:x+w] = face_edges
+def background_edges(smooth, cloth_strength):
+    return cv2.Canny(smooth, cloth_strength, cloth_strength * 2)
+
+
+def face_edges(smooth, face_strength, faces):
+    """顔 ROI ごとの Canny 結果のリスト（faces と同じ順）"""
+    return [cv2.Canny(smooth[y:y+h, x:x+w], face_strength, face_strength * 2)
+            for (x, y, w, h) in faces]
+
+
+def compose_line_image(bg_edges, face_edge_list, faces):
+    edges = bg_edges.copy()
+
+    for (x, y, w, h), fe in zip(faces, face_edge_list):
+        edges[y:y+h, x:x+w] = fe
 
     kernel = np.ones((2, 2), np.uint8)
     edges = cv2.dilate(edges, kernel, iterations=1)
 
     return cv2.bitwise_not(edges)
 
+
+def line_drawing_image(img, face_strength, cloth_strength, faces):
+    smooth = smooth_image(img)
+    return compose_line_image(background_edges(smooth, cloth_strength),
+                              face_edges(smooth, face_strength, faces),
+                              faces)
+
+# === 細線化（線の中心だけを 1 画素幅で残す） ===
+def _zhang_suen(binary):
+    """
+    Zhang–Suen 細線化（numpy で全画素まとめて判定）。
+    binary: 線 = True の bool 画像
+    """
+    img = np.pad(binary, 1).astype(np.uint8)
+
+    while True:
+        changed = False
+        for step in (0, 1):
+            c = img[1:-1, 1:-1]
+            # P2〜P9（上から時計回り）
+            p2, p3, p4 = img[:-2, 1:-1], img[:-2, 2:], img[1:-1, 2:]
+            p5, p6, p7 = img[2:, 2:], img[2:, 1:-1], img[2:, :-2]
+            p8, p9 = img[1:-1, :-2], img[:-2, :-2]
+            seq = [p2, p3, p4, p5, p6, p7, p8, p9, p2]
+
+            B = p2 + p3 + p4 + p5 + p6 + p7 + p8 + p9
+            A = sum(((seq[i] == 0) & (seq[i + 1] == 1)).astype(np.uint8) for i in range(8))
+
+            m = (c == 1) & (B >= 2) & (B <= 6) & (A == 1)
+            if step == 0:
+                m &= (p2 * p4 * p6 == 0) & (p4 * p6 * p8 == 0)
+            else:
+                m &= (p2 * p4 * p8 == 0) & (p2 * p6 * p8 == 0)
+
+            if m.any():
+                c[m] = 0
+                changed = True
+
+        if not changed:
+            return img[1:-1, 1:-1].astype(bool)
+
+
+def _prune_staircase(skel):
+    """
+    Zhang–Suen の後に残る階段の角（上と右がある L 字の角など）を消し、
+    どの画素も 8 近傍で 1 本につながる厳密な 1 画素幅にする。
+    消す条件（4 方向に回して同じ判定）: N と E があり、W・SW・S が空。
+    N と E は斜めで隣り合うので、消しても周りのつながりは変わらない。
+    """
+    img = np.pad(skel, 1).astype(bool)
+
+    while True:
+        changed = False
+        for k in range(4):
+            r = np.rot90(img, k)          # view なので c への書き込みは img に入る
+            c = r[1:-1, 1:-1]
+            n, e = r[:-2, 1:-1], r[1:-1, 2:]
+            w, sw, s = r[1:-1, :-2], r[2:, :-2], r[2:, 1:-1]
+
+            m = c & n & e & ~w & ~sw & ~s
+            if m.any():
+                c[m] = False
+                changed = True
+
+        if not changed:
+            return img[1:-1, 1:-1]
+
+
+def skeletonize(binary):
+    """
+    線 = True の bool 画像を 1 画素幅の骨格にする。
+    opencv-contrib（cv2.ximgproc）があればそれを使い、なければ numpy 版。
+    """
+    if hasattr(cv2, "ximgproc"):
+        skel = cv2.ximgproc.thinning(binary.astype(np.uint8) * 255,
+                                     thinningType=cv2.ximgproc.THINNING_ZHANGSUEN)
+        return _prune_staircase(skel > 0)
+    return _prune_staircase(_zhang_suen(binary))
+
+
+def skeleton_graph(skel):
+    """
+    骨格画素を 8 近傍でつないだ無向グラフ。
+    return: (graph: csr_matrix, ys, xs)  ノード番号 = ys, xs の添字
+    """
+    ys, xs = np.nonzero(skel)
+    n = len(ys)
+    index = np.full(skel.shape, -1, dtype=np.int64)
+    index[ys, xs] = np.arange(n)
+
+    H, W = skel.shape
+    rows, cols = [], []
+    # 右・左下・下・右下の 4 方向だけ見れば全ての辺が 1 回ずつ出る
+    for dy, dx in ((0, 1), (1, -1), (1, 0), (1, 1)):
+        ny, nx = ys + dy, xs + dx
+        ok = (ny < H) & (nx >= 0) & (nx < W)
+        nb = np.full(n, -1, dtype=np.int64)
+        nb[ok] = index[ny[ok], nx[ok]]
+        has = nb >= 0
+        rows.append(np.flatnonzero(has))
+        cols.append(nb[has])
+
+    rows = np.concatenate(rows)
+    cols = np.concatenate(cols)
+    data = np.ones(len(rows), dtype=np.uint8)
+    g = sparse.coo_matrix((data, (rows, cols)), shape=(n, n))
+    return (g + g.T).tocsr(), ys, xs
+
+
+def _dfs_from_starts(graph, starts):
+    """
+    各連結成分の starts から深さ優先でたどった順を、1 回の depth_first_order で求める。
+    仮想の根（番号 = ノード数）から各 start へ辺を張り、根から探索して根を除く。
+    成分ごとにひと続きに並ぶ（成分どうしの順は決まらない）。
+    return: (nodes, pred)  pred の長さはノード数 + 1
+    """
+    n = graph.shape[0]
+    starts = np.asarray(starts, dtype=np.int64)
+    g = graph.tocoo()
+    rows = np.concatenate([g.row, np.full(len(starts), n)])
+    cols = np.concatenate([g.col, starts])
+    data = np.ones(len(rows), dtype=np.uint8)
+    full = sparse.csr_matrix((data, (rows, cols)), shape=(n + 1, n + 1))
+
+    nodes, pred = depth_first_order(full, n, directed=True, return_predecessors=True)
+    return nodes[1:], pred
+
+
+def skeleton_polylines(skel, min_points=5):
+    """
+    骨格を開いた折れ線のリストにする（両側の輪郭ではなく中心線を 1 回だけ）。
+    連結成分ごとに端点（次数 1）から深さ優先でたどり、
+    行き止まりで戻る所で折れ線を切る。戻り先（分岐点）から次の折れ線を始める。
+    return: [(N, 2) int 配列 (x, y), ...]
+    """
+    graph, ys, xs = skeleton_graph(skel)
+    if graph.shape[0] == 0:
+        return []
+
+    deg = np.diff(graph.indptr)
+    n_comp, labels = connected_components(graph, directed=False)
+
+    # 成分ごとに、次数が最小の画素（端点があれば端点）から始める
+    order = np.lexsort((deg, labels))
+    first = np.flatnonzero(np.diff(np.concatenate([[-1], labels[order]])) != 0)
+    starts = order[first]
+
+    nodes, pred = _dfs_from_starts(graph, starts)
+    root = graph.shape[0]
+
+    # 直前の画素が親でない所 = 分岐点まで戻った所（成分の切れ目では親が仮想の根）
+    breaks = np.flatnonzero(pred[nodes[1:]] != nodes[:-1]) + 1
+
+    polylines = []
+    for seg in np.split(nodes, breaks):
+        parent = pred[seg[0]]
+        if parent != root:
+            seg = np.concatenate([[parent], seg])
+        if len(seg) >= min_points:
+            polylines.append(np.column_stack([xs[seg], ys[seg]]))
+
+    return polylines
+
+
+# === 分岐を理解したストローク抽出（分岐点グラフ + オイラー路） ===
+_NEIGHBOR_KERNEL = np.array([[1, 1, 1],
+                             [1, 0, 1],
+                             [1, 1, 1]], dtype=np.float32)
+
+_OFFSETS8 = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+
+
+def _skeleton_chains(rest):
+    """
+    分岐点を除いた骨格（各画素の近傍は 2 個以下）を、画素順の鎖に分ける。
+    return: [(ys, xs, closed), ...]  closed = 端のない輪
+    """
+    graph, ys, xs = skeleton_graph(rest)
+    if graph.shape[0] == 0:
+        return []
+
+    deg = np.diff(graph.indptr)
+    _, labels = connected_components(graph, directed=False)
+
+    order = np.lexsort((deg, labels))
+    first = np.flatnonzero(np.diff(np.concatenate([[-1], labels[order]])) != 0)
+
+    nodes, _ = _dfs_from_starts(graph, order[first])
+    bounds = np.flatnonzero(np.diff(labels[nodes]) != 0) + 1
+
+    return [(ys[seg], xs[seg], deg[seg[0]] == 2)
+            for seg in np.split(nodes, bounds)]
+
+
+def _junction_tree(junction):
+    """
+    隣り合う分岐画素のかたまりを、画素どうしの辺（全域木）でつなぐ。
+    かたまりを重心 1 点にまとめると線から外れるので、実際の画素の上を通す。
+    return: (jy, jx, tree_edges)  tree_edges = [(u, v), ...]  u, v は分岐画素の番号
+    """
+    graph, jy, jx = skeleton_graph(junction)
+    if graph.shape[0] == 0:
+        return jy, jx, []
+
+    # 縦横の辺（長さ 1）を斜め（√2）より先に使う
+    w = graph.astype(float).tocoo()
+    w.data = np.hypot(jy[w.row] - jy[w.col], jx[w.row] - jx[w.col])
+    tree = minimum_spanning_tree(w.tocsr()).tocoo()
+    return jy, jx, list(zip(tree.row.tolist(), tree.col.tolist()))
+
+
+def _junction_pairing(n_j, tree_edges, edges):
+    """
+    分岐画素のかたまりの中の奇数次数の画素を、木の辺を重ねて描く（1〜2 画素の往復）ことで打ち消す。
+    かたまりごとの奇数点は多くて 1 つになり、かたまりを 1 点とみなしたときと同じ本数の一筆書きで済む。
+    （木の上の T-join：子の側に奇数点が奇数個ある辺だけ重ねる）
+    return: 追加する辺 [(u, v), ...]
+    """
+    odd = np.zeros(n_j, dtype=bool)
+    for u, v in edges:
+        if u < n_j:
+            odd[u] ^= True
+        if v < n_j:
+            odd[v] ^= True
+
+    uv = np.array(tree_edges, dtype=np.int64).reshape(-1, 2)
+    g = sparse.coo_matrix((np.ones(len(uv)), (uv[:, 0], uv[:, 1])), shape=(n_j, n_j))
+    tree = (g + g.T).tocsr()
+
+    _, labels = connected_components(tree, directed=False)
+    starts = np.unique(labels, return_index=True)[1]
+    nodes, pred = _dfs_from_starts(tree, starts)
+
+    # 葉の側から：奇数の子は親への辺を重ね、親の偶奇を反転
+    extra = []
+    for v in nodes[::-1]:
+        p = pred[v]
+        if odd[v] and p != n_j:
+            extra.append((int(v), int(p)))
+            odd[v] = False
+            odd[p] ^= True
+    return extra
+
+
+def _euler_trails(n_nodes, edges, node_xy):
+    """
+    多重グラフ edges = [(u, v), ...] を、できるだけ少ない本数の一筆書きで覆う。
+    連結成分ごとに奇数次数の点を近い順に 2 個ずつ仮想辺（ペン上げ）で結び、
+    最後の 1 組を一筆書きの始点・終点にする（Hierholzer 法）。
+    return: [[(edge_id, from_node), ...], ...]  仮想辺のところで切った一筆書きのリスト
+    """
+    n_real = len(edges)
+    edges = list(edges)
+
+    deg = np.zeros(n_nodes, dtype=int)
+    for u, v in edges:
+        deg[u] += 1
+        deg[v] += 1
+
+    # --- 連結成分 ---
+    if n_real:
+        uv = np.array(edges)
+        g = sparse.coo_matrix((np.ones(n_real), (uv[:, 0], uv[:, 1])), shape=(n_nodes, n_nodes))
+        _, comp = connected_components(g, directed=False)
+    else:
+        comp = np.arange(n_nodes)
+
+    # --- 奇数点を近い順にペアにして仮想辺を足す（各成分で 1 組だけ残す） ---
+    starts = []
+    for c in np.unique(comp[deg > 0]):
+        members = np.flatnonzero((comp == c) & (deg > 0))
+        odd = members[deg[members] % 2 == 1]
+
+        if len(odd) > 2:
+            pxy = node_xy[odd]
+            dist = np.hypot(*(pxy[:, None, :] - pxy[None, :, :]).transpose(2, 0, 1))
+            iu, ju = np.triu_indices(len(odd), k=1)
+            free = np.ones(len(odd), dtype=bool)
+            left = len(odd)
+            for k in np.argsort(dist[iu, ju], kind="stable"):
+                if left == 2:
+                    break
+                a, b = iu[k], ju[k]
+                if free[a] and free[b]:
+                    free[a] = free[b] = False
+                    left -= 2
+                    edges.append((odd[a], odd[b]))
+            odd = odd[free]
+
+        starts.append(odd[0] if len(odd) else members[0])
+
+    # --- Hierholzer ---
+    adj = [[] for _ in range(n_nodes)]
+    for eid, (u, v) in enumerate(edges):
+        adj[u].append((eid, v))
+        adj[v].append((eid, u))
+
+    used = np.zeros(len(edges), dtype=bool)
+    trails = []
+
+    for start in starts:
+        stack = [(start, None)]
+        walk = []
+        while stack:
+            v, via = stack[-1]
+            while adj[v] and used[adj[v][-1][0]]:
+                adj[v].pop()
+            if adj[v]:
+                eid, w = adj[v].pop()
+                used[eid] = True
+                stack.append((w, (eid, v)))
+            else:
+                stack.pop()
+                if via is not None:
+                    walk.append(via)
+        walk.reverse()
+
+        # 仮想辺で切る
+        cur = []
+        for eid, frm in walk:
+            if eid >= n_real:
+                if cur:
+                    trails.append(cur)
+                cur = []
+            else:
+                cur.append((eid, frm))
+        if cur:
+            trails.append(cur)
+
+    return trails
+
+
+def skeleton_strokes(skel, min_points=5):
+    """
+    骨格を「端点・分岐点（ノード）」と「その間の鎖（辺）」のグラフにし、
+    奇数次数の点のペアリング + オイラー路で、ペン上げが最少になる一筆書きに分ける。
+    分岐点は分岐画素そのもの（隣り合う分岐画素は全域木の辺でつなぐ）なので、
+    一筆書きの点はすべて骨格の画素の上にあり、続く点どうしは 8 近傍で隣り合う。
+    近傍数は filter2D で全画素まとめて数える（画素ごとの再帰はしない）。
+    return: [(N, 2) int 配列 (x, y), ...]
+    """
+    skel = skel.astype(np.uint8)
+
+    nb = cv2.filter2D(skel, cv2.CV_8U, _NEIGHBOR_KERNEL, borderType=cv2.BORDER_CONSTANT)
+    junction = (skel == 1) & (nb >= 3)
+
+    jy, jx, tree_edges = _junction_tree(junction)
+    n_j = len(jy)
+    jindex = np.full(np.add(skel.shape, 2), -1, dtype=np.int64)
+    jindex[jy + 1, jx + 1] = np.arange(n_j)
+
+    chains = _skeleton_chains((skel == 1) & ~junction)
+
+    # --- 鎖の端の 8 近傍にある分岐画素（端は近傍 2 個以下なので、多くて 2 個） ---
+    def touching(y, x):
+        nbs = np.array([jindex[y + 1 + dy, x + 1 + dx] for dy, dx in _OFFSETS8])
+        return nbs[nbs >= 0]
+
+    node_xy = [(x, y) for y, x in zip(jy, jx)]
+    jxy = np.column_stack([jx, jy])
+    edges = list(tree_edges)
+    edge_pts = [jxy[[u, v]] for u, v in tree_edges]
+    strokes = []
+
+    for ys, xs, closed in chains:
+        pts = np.column_stack([xs, ys])
+
+        if closed:
+            # 分岐のない輪はそのまま 1 本（始点に戻って閉じる）
+            strokes.append(np.vstack([pts, pts[:1]]))
+            continue
+
+        ends = []
+        for k, (y, x) in enumerate(((ys[0], xs[0]), (ys[-1], xs[-1]))):
+            nbs = touching(y, x)
+            if len(nbs):
+                # 1 画素だけの鎖は、両端で別の分岐画素につなぐ
+                ends.append(int(nbs[0] if k == 0 else nbs[-1]))
+            else:
+                node_xy.append((x, y))
+                ends.append(len(node_xy) - 1)
+
+        u, v = ends
+        if u < n_j:
+            pts = np.vstack([jxy[u], pts])
+        if v < n_j:
+            pts = np.vstack([pts, jxy[v]])
+
+        edges.append((u, v))
+        edge_pts.append(pts)
+
+    for u, v in _junction_pairing(n_j, tree_edges, edges):
+        edges.append((u, v))
+        edge_pts.append(jxy[[u, v]])
+
+    node_xy = np.array(node_xy, dtype=float).reshape(-1, 2)
+
+    for trail in _euler_trails(len(node_xy), edges, node_xy):
+        parts = []
+        for eid, frm in trail:
+            pts = edge_pts[eid] if edges[eid][0] == frm else edge_pts[eid][::-1]
+            parts.append(pts if not parts else pts[1:])
+        strokes.append(np.vstack(parts))
+
+    return [s for s in strokes if len(s) >= min_points]
+
+
 # === SVG 変換用処理 ===
 def save_debug_image(line_img, debug_jpg):
     cv2.imwrite(debug_jpg, line_img)
@@ -124,6 +595,7 @@ def optimize_svg_with_vpype(raw_svg, final_svg):
     print(f"🎨 vpype最適化 → {final_svg}")
 
 # === 線画 → SVG まで一発処理 ===
+# ファイルと子プロセスを使わない版は list2gcode.processor.vectorize_curves
 def convert_to_svg(line_jpg, debug_jpg, bitmap_pgm, raw_svg, final_svg):
     line_img = cv2.imread(line_jpg, cv2.IMREAD_GRAYSCALE)
     save_debug_image(line_img, debug_jpg)
@@ -136,7 +608,18 @@ def convert_to_svg(line_jpg, debug_jpg, bitmap_pgm, raw_svg, final_svg):
 
 
 
-def preview_curve_groups(line_img, max_curves):
+def sorted_curves(line_img, mode="contour", min_points=5):
+    """
+    線画から曲線を取り出し、長い順に並べたリスト（本数では切らない）。
+    曲線数だけ変えたときは、これを切り詰めれば済む。
+    プレビューと extract_curve_list の両方がこれを使うので、見えている線がそのまま出力になる。
+
+    mode="contour"  : 線の輪郭（線の両側を 1 周する閉曲線）
+    mode="skeleton" : 線を 1 画素幅に細線化した中心線
+    mode="graph"    : 中心線を分岐点で区切ったグラフにし、一筆書きでつなぐ
+
+    return: [(k, 2) int 配列 (x, y), ...]
+    """
     if len(line_img.shape) == 3:
         gray = cv2.cvtColor(line_img, cv2.COLOR_BGR2GRAY)
     else:
@@ -148,21 +631,42 @@ def preview_curve_groups(line_img, max_curves):
     )
     th = 255 - th
 
-    contours, _ = cv2.findContours(th, cv2.RETR_LIST, cv2.CHAIN_APPROX_NONE)
-    contours = [c for c in contours if len(c) > 5]
+    if mode in ("skeleton", "graph"):
+        trace = skeleton_strokes if mode == "graph" else skeleton_polylines
+        curves = trace(skeletonize(th > 0), min_points=min_points)
+    elif mode == "contour":
+        contours, _ = cv2.findContours(th, cv2.RETR_LIST, cv2.CHAIN_APPROX_NONE)
+        curves = [c.reshape(-1, 2) for c in contours if len(c) >= min_points]
+    else:
+        raise ValueError(f"❌ 不明な mode 指定: {mode}")
 
-    contours = sorted(
-        contours,
-        key=lambda c: cv2.arcLength(c, closed=False),
+    return sorted(
+        curves,
+        key=lambda p: cv2.arcLength(p.reshape(-1, 1, 2).astype(np.int32), closed=False),
         reverse=True
-    )[:max_curves]
+    )
+
+
+def preview_curve_groups(line_img, max_curves, curves=None, mode="contour"):
+    if len(line_img.shape) == 3:
+        gray = cv2.cvtColor(line_img, cv2.COLOR_BGR2GRAY)
+    else:
+        gray = line_img
+
+    if curves is None:
+        curves = sorted_curves(gray, mode=mode)
+    curves = curves[:max_curves]
 
     debug = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
 
-    for idx, cnt in enumerate(contours):
+    for idx, cnt in enumerate(curves):
         color = id_to_color(idx)  # ← 色が固定される！
-        for p in cnt.reshape(-1, 2):
-            cv2.circle(debug, (p[0], p[1]), 1, color, -1)
+        pts = np.asarray(cnt).reshape(-1, 2).astype(int)
+        # 半径 1 の塗り円 = 3x3 の十字（cv2.circle を点ごとに呼ばない）
+        for dx, dy in ((0, 0), (1, 0), (-1, 0), (0, 1), (0, -1)):
+            x = np.clip(pts[:, 0] + dx, 0, debug.shape[1] - 1)
+            y = np.clip(pts[:, 1] + dy, 0, debug.shape[0] - 1)
+            debug[y, x] = color
 
     return debug
 
@@ -4,13 +4,24 @@ import numpy as np
 from .library import (
     detect_face_once,
     line_drawing_image,
+    smooth_image,
+    background_edges,
+    face_edges,
+    compose_line_image,
+    sorted_curves,
     resize_with_aspect,
-    crop_to_aspect,
-    preview_curve_groups
+    center_crop_aspect,
+    preview_curve_groups,
+    detect_face_small,
+    track_faces
 )
 
 BASE_DIR = Path(__file__).resolve().parent
 
+# 線画を作る前にそろえる画像サイズ（縦横比補正）
+TARGET_W = 1000
+TARGET_H = 1480
+
 
 # -------------------------------------------------------
 # 色決定（固定色アルゴリズム）
@@ -36,39 +47,36 @@ def load_image_from_file(image_path):
 # -------------------------------------------------------
 # findContours → 曲線抽出
 # -------------------------------------------------------
-def extract_curve_list(line_img, max_curves=70, min_points=5):
-
-    if len(line_img.shape) == 3:
-        gray = cv2.cvtColor(line_img, cv2.COLOR_BGR2GRAY)
-    else:
-        gray = line_img
-
-    _, th = cv2.threshold(gray, 0, 255,
-                          cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-    th = 255 - th
-
-    contours, _ = cv2.findContours(th, cv2.RETR_LIST, cv2.CHAIN_APPROX_NONE)
-    contours = [c for c in contours if len(c) >= min_points]
-
-    contours = sorted(
-        contours,
-        key=lambda c: cv2.arcLength(c, closed=False),
-        reverse=True
-    )[:max_curves]
+def extract_curve_list(line_img, max_curves=70, min_points=5, mode="contour"):
+    """
+    mode="contour"  : 線の輪郭（線の両側を 1 周する閉曲線）
+    mode="skeleton" : 線を 1 画素幅に細線化した中心線（開いた折れ線、線を 1 回だけ描く）
+    mode="graph"    : 中心線を分岐点で区切ったグラフにし、一筆書きでつなぐ（ペン上げ最少）
+    """
+    curves = sorted_curves(line_img, mode=mode, min_points=min_points)
+    return _to_curve_list(curves[:max_curves])
 
-    curve_list = []
-    for idx, cnt in enumerate(contours, start=1):
-        pts = cnt.reshape(-1, 2)
-        pts_list = [(int(x), int(y)) for (x, y) in pts]
-        curve_list.append({"curve_id": idx, "points": pts_list})
 
-    return curve_list
+def _to_curve_list(curves):
+    """
+    sorted_curves の結果 → [{"curve_id", "points": [(x, y), ...]}, ...]
+    """
+    return [
+        {"curve_id": idx, "points": [(int(x), int(y)) for (x, y) in pts]}
+        for idx, pts in enumerate(curves, start=1)
+    ]
 
 
 # -------------------------------------------------------
 # カメラ撮影で画像を取得
 # -------------------------------------------------------
-def capture_image_from_camera():
+def capture_image_from_camera(detect_every=5, detect_width=320, display_width=540):
+    """
+    プレビュー中の顔検出は縮小画像（幅 detect_width 以下）で detect_every フレームごとに行い、
+    間のフレームは matchTemplate で矩形を追跡する。
+    フレームは縦横比だけ合わせて（拡大しない）、検出用と表示用（幅 display_width）へ直接縮小する。
+    撮影した静止画の顔検出は capture_and_extract_curve_list 側でフル解像度で行う。
+    """
 
     print("カメラを起動します... (Space: 撮影 / q: 終了)")
 
@@ -83,6 +91,10 @@ def capture_image_from_camera():
 
     img = None
 
+    frame_no = 0
+    prev_gray = None
+    faces_small = np.empty((0, 4), dtype=int)
+
     while True:
         ret, frame = cap.read()
 
@@ -90,11 +102,34 @@ def capture_image_from_camera():
             print("❌ フレーム取得失敗")
             continue
 
-        preview = crop_to_aspect(frame, PREVIEW_W, PREVIEW_H)
-        faces_live = detect_face_once(preview)
+        # 縦横比だけ合わせる（view。PREVIEW_W × PREVIEW_H へは拡大しない）
+        cropped = center_crop_aspect(frame, PREVIEW_W, PREVIEW_H)
+        crop_h, crop_w = cropped.shape[:2]
+
+        # --- 検出幅へ直接縮小して検出 / 追跡 ---
+        det_w = min(detect_width, crop_w)
+        det_h = max(1, round(crop_h * det_w / crop_w))
+        small = cv2.resize(cropped, (det_w, det_h), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+        # minSize（detect_face_small）は PREVIEW_W 幅の画像での大きさで数える
+        scale = PREVIEW_W / det_w
 
-        preview_display = preview.copy()
-        for (x, y, w, h) in faces_live:
+        if frame_no % detect_every == 0 or prev_gray is None:
+            faces_small = detect_face_small(gray, scale)
+        else:
+            faces_small = track_faces(prev_gray, gray, faces_small)
+
+        prev_gray = gray
+        frame_no += 1
+
+        # --- 表示用の大きさへ縮小し、矩形も表示の倍率に直して描く ---
+        disp_w = min(display_width, crop_w)
+        disp_h = max(1, round(crop_h * disp_w / crop_w))
+        preview_display = cv2.resize(cropped, (disp_w, disp_h), interpolation=cv2.INTER_AREA)
+        faces_disp = np.round(faces_small * (disp_w / det_w)).astype(int)
+
+        for (x, y, w, h) in faces_disp:
             cv2.rectangle(preview_display, (x, y, w, h), (0, 255, 0), 2)
             cv2.putText(preview_display, "FACE", (x, y - 5),
                         cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
@@ -126,11 +161,13 @@ def capture_image_from_camera():
 # -------------------------------------------------------
 def capture_and_extract_curve_list(
         source="camera",
-        image_path=None
+        image_path=None,
+        mode="contour"
     ):
     """
     source="camera" → カメラ撮影
     source="image"  → JPEGから読み込み
+    mode は extract_curve_list と同じ（"contour" / "skeleton" / "graph"）
     """
 
     # -------------------------
@@ -153,8 +190,6 @@ def capture_and_extract_curve_list(
     # -------------------------
     # 縦横比補正
     # -------------------------
-    TARGET_W = 1000
-    TARGET_H = 1480
     img = resize_with_aspect(img, TARGET_W, TARGET_H)
 
     # -------------------------
@@ -172,16 +207,38 @@ def capture_and_extract_curve_list(
     cv2.namedWindow("Line Adjustment", cv2.WINDOW_AUTOSIZE)
     cv2.namedWindow("Curve Preview", cv2.WINDOW_AUTOSIZE)
 
+    # 平滑化は 1 回だけ。エッジは各層の最新 1 つだけ覚えておき、変わった層だけ作り直す
+    # （キーを押すたびに強さが変わるので、古い強さのエッジは持たない）
+    smooth = smooth_image(img)
+    bg_layer = (None, None)      # (cloth_strength, 背景エッジ)
+    face_layer = (None, None)    # (face_strength, 顔エッジ)
+
+    shown = None       # 表示中の (face_strength, cloth_strength, curve_count)
+    line_key = None    # line_img / curves を作ったときの (face, cloth)
+
     while True:
-        line_img = line_drawing_image(img, face_strength, cloth_strength, faces)
+        state = (face_strength, cloth_strength, curve_count)
+
+        if state != shown:
+            if (face_strength, cloth_strength) != line_key:
+                if bg_layer[0] != cloth_strength:
+                    bg_layer = (cloth_strength, background_edges(smooth, cloth_strength))
+                if face_layer[0] != face_strength:
+                    face_layer = (face_strength, face_edges(smooth, face_strength, faces))
 
-        disp = cv2.cvtColor(line_img, cv2.COLOR_GRAY2BGR)
-        for (x, y, w, h) in faces:
-            cv2.rectangle(disp, (x, y, w, h), (0, 255, 0), 2)
-        cv2.imshow("Line Adjustment", disp)
+                line_img = compose_line_image(bg_layer[1], face_layer[1], faces)
+                # プレビューも出力と同じ mode で曲線を取る（ENTER でそのまま使う）
+                curves = sorted_curves(line_img, mode=mode)
+                line_key = (face_strength, cloth_strength)
 
-        curve_preview = preview_curve_groups(line_img, curve_count)
-        cv2.imshow("Curve Preview", curve_preview)
+                disp = cv2.cvtColor(line_img, cv2.COLOR_GRAY2BGR)
+                for (x, y, w, h) in faces:
+                    cv2.rectangle(disp, (x, y, w, h), (0, 255, 0), 2)
+                cv2.imshow("Line Adjustment", disp)
+
+            curve_preview = preview_curve_groups(line_img, curve_count, curves)
+            cv2.imshow("Curve Preview", curve_preview)
+            shown = state
 
         key = cv2.waitKey(30) & 0xFF
 
@@ -211,10 +268,21 @@ def capture_and_extract_curve_list(
     cv2.destroyAllWindows()
 
     # -------------------------
-    # 曲線リスト抽出
+    # 曲線リスト抽出（プレビューで見ていた曲線をそのまま使う）
     # -------------------------
-    return extract_curve_list(line_img, max_curves=curve_count)
-
-
+    return _to_curve_list(curves[:curve_count])
 
 
+# -------------------------------------------------------
+# ウィンドウを出さずに曲線リストを作る（batch.py 用）
+# -------------------------------------------------------
+def extract_curve_list_headless(img, face_strength=40, cloth_strength=120, curve_count=70,
+                                mode="contour"):
+    """
+    調整ウィンドウの代わりに、強さと曲線数を引数で受け取る。
+    処理内容は capture_and_extract_curve_list で ENTER を押したときと同じ。
+    """
+    img = resize_with_aspect(img, TARGET_W, TARGET_H)
+    faces = detect_face_once(img)
+    line_img = line_drawing_image(img, face_strength, cloth_strength, faces)
+    return extract_curve_list(line_img, max_curves=curve_count, mode=mode)
@@ -0,0 +1,140 @@
+# list2gcode/curveset.py
+# =========================================
+#  CurveSet : 曲線リストを 1 本の連続配列で持つ入れ物
+# =========================================
+
+import numpy as np
+
+
+class CurveSet:
+    """
+    {"curve_id", "points"} の辞書リストの代わりに、全曲線の点を
+    1 本の配列にまとめて持つ。
+
+      points    : (M, 2) float64  全曲線の点を連結したもの
+      offsets   : (n+1,) int64    曲線 i の点は points[offsets[i]:offsets[i+1]]
+      curve_ids : (n,)            各曲線の curve_id
+
+    for curve in curve_set で {"curve_id", "points": (k, 2) の view} が
+    順に取れるので、辞書リストを受け取る既存の関数にもそのまま渡せる。
+    """
+
+    def __init__(self, points, offsets, curve_ids):
+        self.points = np.asarray(points, dtype=float).reshape(-1, 2)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.curve_ids = np.asarray(curve_ids)
+
+        if len(self.offsets) != len(self.curve_ids) + 1:
+            raise ValueError("❌ offsets の長さは曲線数 + 1 にしてください")
+        if len(self.offsets) and self.offsets[-1] != len(self.points):
+            raise ValueError("❌ offsets[-1] と点数が一致しません")
+
+    # ---------------------------------
+    # 作成・変換
+    # ---------------------------------
+    @classmethod
+    def from_arrays(cls, arrays, curve_ids=None):
+        """
+        (k_i, 2) の配列のリストから作る。
+        """
+        arrays = [np.asarray(a, dtype=float).reshape(-1, 2) for a in arrays]
+        if curve_ids is None:
+            curve_ids = np.arange(1, len(arrays) + 1)
+
+        lengths = np.array([len(a) for a in arrays], dtype=np.int64)
+        offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        points = np.concatenate(arrays) if arrays else np.zeros((0, 2))
+        return cls(points, offsets, curve_ids)
+
+    @classmethod
+    def from_curve_list(cls, curve_list):
+        """
+        [{"curve_id":..., "points":[(x,y),...]}, ...] から作る。
+        （点に角度などが付いていても x, y だけ使う）
+        """
+        if isinstance(curve_list, CurveSet):
+            return curve_list
+
+        arrays = []
+        ids = []
+        for curve in curve_list:
+            pts = np.asarray(curve["points"], dtype=float)
+            arrays.append(pts.reshape(len(pts), -1)[:, :2] if len(pts) else pts.reshape(0, 2))
+            ids.append(curve["curve_id"])
+        return cls.from_arrays(arrays, ids)
+
+    def to_curve_list(self):
+        """
+        従来の辞書リスト（points は float のタプル）に戻す。
+        """
+        flat = self.points.tolist()
+        return [
+            {
+                "curve_id": self._id(i),
+                "points": [(x, y) for x, y in flat[self.offsets[i]:self.offsets[i + 1]]]
+            }
+            for i in range(len(self))
+        ]
+
+    def with_points(self, points):
+        """
+        同じ区切りのまま点だけ差し替えた CurveSet を返す（点数は同じであること）。
+        """
+        return CurveSet(points, self.offsets, self.curve_ids)
+
+    def copy(self):
+        return CurveSet(self.points.copy(), self.offsets.copy(), self.curve_ids.copy())
+
+    def take(self, order, flip=None):
+        """
+        曲線を order の順に並べ替えた CurveSet を返す。
+        flip[i] が True の曲線は点を逆順にする（TSP で向きを変えるとき）。
+        """
+        order = np.asarray(order, dtype=np.int64)
+        lengths = self.lengths[order]
+        offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+
+        # 新しい各点が、元の曲線の何番目の点か
+        local = np.arange(offsets[-1]) - np.repeat(offsets[:-1], lengths)
+        if flip is not None:
+            rev = np.repeat(np.asarray(flip, dtype=bool), lengths)
+            local = np.where(rev, np.repeat(lengths, lengths) - 1 - local, local)
+
+        src = np.repeat(self.offsets[:-1][order], lengths) + local
+        return CurveSet(self.points[src], offsets, self.curve_ids[order])
+
+    # ---------------------------------
+    # 参照
+    # ---------------------------------
+    def __len__(self):
+        return len(self.curve_ids)
+
+    def _id(self, i):
+        cid = self.curve_ids[i]
+        return cid.item() if hasattr(cid, "item") else cid
+
+    def curve(self, i):
+        """
+        曲線 i の点 (k, 2)（points の view）
+        """
+        return self.points[self.offsets[i]:self.offsets[i + 1]]
+
+    def __getitem__(self, i):
+        return {"curve_id": self._id(i), "points": self.curve(i)}
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    @property
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    def point_curve_index(self):
+        """
+        各点がどの曲線に属するか (M,)
+        """
+        return np.repeat(np.arange(len(self)), self.lengths)
+
+    def __repr__(self):
+        return f"CurveSet({len(self)} curves, {len(self.points)} points)"
@@ -1,69 +1,229 @@
 # list2gcode/list2goodlist.py
 
 import numpy as np
-import cv2
 import matplotlib.pyplot as plt
 from matplotlib.colors import hsv_to_rgb
 import csv
 import math
+import time
+from scipy.spatial import cKDTree, ConvexHull, QhullError
+
+from .curveset import CurveSet
 
 
 # =========================================================
-# 0. approxPolyDP で曲線点を approx N points へ簡略化
+# 0. RDP の重要度順位で曲線点を N points へ簡略化
 # =========================================================
+def rdp_significance(points, breaks=None):
+    """
+    Ramer–Douglas–Peucker を最後まで 1 回だけ回し、各頂点が
+    「何 px の ε まで残るか」（重要度）を記録する。
+    重要度は親より大きくならないように抑えてあるので、
+    上位 N 個を取れば ε を調整した RDP の結果と同じ入れ子の点集合になる。
+
+    breaks : 複数の曲線を連結した点列のときの各曲線の先頭番号（CurveSet.offsets[:-1]）。
+             各曲線の両端を最初から固定するので、区間が曲線をまたがず、
+             全曲線を曲線ごとに回したのと同じ重要度が 1 回で求まる。
+
+    return: (N,) 重要度（両端点は inf）
+    """
+    pts = np.asarray(points, dtype=float).reshape(-1, 2)
+    N = len(pts)
+    sig = np.zeros(N)
+    if N == 0:
+        return sig
+
+    fixed = np.zeros(N, dtype=bool)
+    fixed[0] = fixed[-1] = True
+    if breaks is not None:
+        b = np.asarray(breaks, dtype=np.int64)
+        b = b[(b > 0) & (b < N)]
+        fixed[b] = fixed[b - 1] = True
+    sig[fixed] = np.inf
+    idx = np.arange(N)
+
+    # 再帰の代わりに「同じ深さの区間」をまとめて 1 回の配列演算で処理する
+    while not fixed.all():
+        F = np.flatnonzero(fixed)
+        free = idx[~fixed]
+
+        # 各点が属する区間 [lo, hi]（両端はすでに残ると決まった点）
+        pos = np.searchsorted(F, free)
+        lo = F[pos - 1]
+        hi = F[pos]
+
+        a = pts[lo]
+        ab = pts[hi] - a
+        L = np.hypot(ab[:, 0], ab[:, 1])
+        ap = pts[free] - a
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            d = np.abs(ab[:, 0] * ap[:, 1] - ab[:, 1] * ap[:, 0]) / L
+        # 始点と終点が同じ（閉じた輪郭など）→ 点までの距離
+        degenerate = L < 1e-12
+        d[degenerate] = np.hypot(ap[degenerate, 0], ap[degenerate, 1])
+
+        # 区間ごとに最も遠い点を 1 つ選ぶ（free は区間ごとに連続している）
+        starts = np.flatnonzero(np.r_[True, lo[1:] != lo[:-1]])
+        seg_max = np.maximum.reduceat(d, starts)
+        seg_of = np.cumsum(np.r_[False, lo[1:] != lo[:-1]])
+        is_max = d == seg_max[seg_of]
+        _, first = np.unique(seg_of[is_max], return_index=True)
+        k = np.flatnonzero(is_max)[first]
+
+        # 重要度は区間の親（両端の重要度の小さい方）を超えない
+        parent = np.minimum(sig[lo[k]], sig[hi[k]])
+        sig[free[k]] = np.minimum(d[k], parent)
+        fixed[free[k]] = True
+
+        # 一直線の区間（最大距離 0）は中の点を全部まとめて重要度 0 で確定
+        flat = seg_max[seg_of] <= 1e-12
+        fixed[free[flat]] = True
+
+    return sig
+
+
+def _select_by_significance(sig, target_points):
+    """
+    重要度の上位 target_points 個の番号を、元の順番で返す。
+    （同じ重要度なら前の点を残す。simplify_curve_list と同じ選び方）
+    """
+    if len(sig) <= target_points:
+        return np.arange(len(sig))
+    keep = np.argsort(-sig, kind="stable")[:target_points]
+    return np.sort(keep)
+
+
 def simplify_curve(points, target_points=80):
-    pts = np.array(points, dtype=np.float32)
+    """
+    曲線を target_points 点ちょうどに簡略化する（RDP の重要度で上位を残す）。
+    ε を変えて何度も approxPolyDP をかけ直す必要がない。
+    """
+    pts = np.array(points, dtype=float).reshape(-1, 2)
 
     if len(pts) <= target_points:
         return pts.tolist()
 
-    epsilon = 0.01 * cv2.arcLength(pts, closed=False)
-    simp = cv2.approxPolyDP(pts, epsilon, closed=False).reshape(-1, 2)
-
-    # ε を調整して点数が target に近づくようにする
-    for _ in range(10):
-        n = len(simp)
-        if n > target_points * 1.2:
-            epsilon *= 1.4
-        elif n < target_points * 0.8:
-            epsilon *= 0.7
-        else:
-            break
-        simp = cv2.approxPolyDP(pts, epsilon, closed=False).reshape(-1, 2)
+    keep = _select_by_significance(rdp_significance(pts), target_points)
+    return pts[keep].tolist()
+
+
+def simplify_curve_list(curve_list, target_points=80):
+    """
+    simplify_curve の全曲線まとめ版。
+    全曲線の点を連結したまま rdp_significance を 1 回だけ回し、
+    曲線ごとに重要度の上位 target_points 個を残す（曲線ごとのループなし）。
+    結果は各曲線に simplify_curve をかけたものと同じ。
+    CurveSet を渡すと CurveSet、辞書リストなら辞書リストを返す。
+    """
+    curves = CurveSet.from_curve_list(curve_list)
+    lengths = curves.lengths
 
-    return simp.tolist()
+    sig = rdp_significance(curves.points, breaks=curves.offsets[:-1])
+
+    # 曲線ごとに重要度の高い順（同点は前の点）に並べ、各曲線の先頭 target_points 個を残す
+    owner = curves.point_curve_index()
+    order = np.lexsort((np.arange(len(sig)), -sig, owner))
+    rank = np.arange(len(sig)) - np.repeat(curves.offsets[:-1], lengths)
+    keep = np.zeros(len(sig), dtype=bool)
+    keep[order[rank < target_points]] = True
+
+    new_lengths = np.minimum(lengths, target_points)
+    out = CurveSet(curves.points[keep],
+                   np.concatenate([[0], np.cumsum(new_lengths)]),
+                   curves.curve_ids)
+    if isinstance(curve_list, CurveSet):
+        return out
+    return out.to_curve_list()
 
 
 # =========================================================
 # 1. 曲線内部の点を並べ替える（RDPの特性利用）
 # =========================================================
+def _far_endpoints(pts, sweeps=3):
+    """
+    点群内で最も遠い 2 点を求める（全点間距離行列を作らない）。
+    最遠点対は必ず凸包の頂点なので、凸包（O(N log N)）の頂点どうしだけ比べる。
+    凸包が作れない（一直線など）場合は、最遠点へ飛ぶ操作を繰り返す近似（double sweep）。
+    """
+    try:
+        hull = ConvexHull(pts).vertices
+    except QhullError:
+        hull = None
+
+    if hull is not None and len(hull) <= 2000:
+        h = pts[hull]
+        d = np.einsum("ijk,ijk->ij", h[:, None] - h[None], h[:, None] - h[None])
+        a, b = np.unravel_index(np.argmax(d), d.shape)
+        return tuple(sorted((int(hull[a]), int(hull[b]))))
+
+    i = 0
+    j = int(np.argmax(np.einsum("ij,ij->i", pts - pts[i], pts - pts[i])))
+    best = -1.0
+
+    for _ in range(sweeps):
+        d = np.einsum("ij,ij->i", pts - pts[j], pts - pts[j])
+        k = int(np.argmax(d))
+        if d[k] <= best:
+            break
+        best = d[k]
+        i, j = j, k
+
+    return tuple(sorted((i, j)))
+
+
+def _greedy_order_kdtree(pts, tree, start_idx):
+    """
+    start_idx から最近傍の未使用点を順にたどる。
+    近傍は KD-tree で k 個ずつ取り、全部使用済みなら k を倍にして取り直す。
+    """
+    N = len(pts)
+    used = np.zeros(N, dtype=bool)
+    order = np.empty(N, dtype=int)
+
+    idx = start_idx
+    used[idx] = True
+    order[0] = idx
+    k = 8
+
+    for n in range(1, N):
+        while True:
+            kk = min(k, N)
+            _, cand = tree.query(pts[idx], k=kk)
+            cand = np.atleast_1d(cand)
+            free = cand[~used[cand]]
+            if len(free):
+                idx = int(free[0])
+                break
+            if kk == N:
+                raise RuntimeError("未使用点が見つかりません")
+            k *= 2
+
+        # 使用済みが増えたら k を戻す（密な所では 8 で足りる）
+        k = max(8, k // 2)
+        used[idx] = True
+        order[n] = idx
+
+    return order
+
+
 def reorder_curve(points):
-    pts = np.array(points)
+    pts = np.array(points, dtype=float)
     N = len(pts)
 
+    if N < 3:
+        return pts.tolist()
+
     # --- 両端候補の算出 ---
     # 端点は点群内で最も遠い2点（幾何学的線形性が高い）
-    dmat = np.linalg.norm(pts[:,None,:] - pts[None,:,:], axis=-1)
-    i0, j0 = np.unravel_index(np.argmax(dmat), dmat.shape)
-
-    def greedy_order(start_idx):
-        used = np.zeros(N, dtype=bool)
-        idx = start_idx
-        used[idx] = True
-        ordered = [pts[idx]]
-
-        for _ in range(N - 1):
-            d = np.linalg.norm(pts - ordered[-1], axis=1)
-            d[used] = 1e18
-            idx = np.argmin(d)
-            used[idx] = True
-            ordered.append(pts[idx])
+    i0, j0 = _far_endpoints(pts)
 
-        return np.array(ordered)
+    # 最近傍探索は KD-tree で（O(N log N)）
+    tree = cKDTree(pts)
 
     # 始点を両端候補 A と B で試す
-    seqA = greedy_order(i0)
-    seqB = greedy_order(j0)
+    seqA = pts[_greedy_order_kdtree(pts, tree, i0)]
+    seqB = pts[_greedy_order_kdtree(pts, tree, j0)]
 
     def path_len(arr):
         return np.sum(np.linalg.norm(arr[1:] - arr[:-1], axis=1))
@@ -126,42 +286,400 @@ def tsp_order(curve_list):
 
     # entry = 曲線の最初の点
     # exit  = 曲線の最後の点
-    entries = np.array([curve["points"][0]  for curve in curve_list])
-    exits   = np.array([curve["points"][-1] for curve in curve_list])
+    entries = np.array([curve["points"][0]  for curve in curve_list], dtype=float)
+    exits   = np.array([curve["points"][-1] for curve in curve_list], dtype=float)
 
-    # 距離行列 exit[i] → entry[j]
-    dist = np.zeros((N, N))
-    for i in range(N):
-        for j in range(N):
-            dist[i, j] = np.linalg.norm(exits[i] - entries[j])
+    # 距離行列 exit[i] → entry[j]（ブロードキャストで一括）
+    dist = np.linalg.norm(exits[:, None, :] - entries[None, :, :], axis=-1)
 
     # ---- 近傍法 ----
-    unvisited = set(range(N))
+    unvisited = np.ones(N, dtype=bool)
     route = []
 
     # 便宜的に curve 0 から開始
     current = 0
     route.append(current)
-    unvisited.remove(current)
+    unvisited[current] = False
 
-    while unvisited:
-        nxt = min(unvisited, key=lambda j: dist[current, j])
+    for _ in range(N - 1):
+        d = np.where(unvisited, dist[current], np.inf)
+        nxt = int(np.argmin(d))
         route.append(nxt)
-        unvisited.remove(nxt)
+        unvisited[nxt] = False
         current = nxt
 
     return route
 
 
-def reorder_curves_by_tsp(curve_list):
+# ---------------------------------------------------------
+# 向き（逆順で描く）も選ぶ TSP ＋ 2-opt / Or-opt 改善
+# ---------------------------------------------------------
+def _point_dist(a, b, metric="euclid"):
+    """
+    a, b の距離（ブロードキャスト可）
+    euclid    : 通常の距離（xy）
+    chebyshev : max(|Δ0|, |Δ1|)（関節ステップ空間で使う）
+    """
+    diff = np.abs(np.asarray(a, dtype=float) - np.asarray(b, dtype=float))
+    if metric == "euclid":
+        return np.hypot(diff[..., 0], diff[..., 1])
+    elif metric == "chebyshev":
+        return diff.max(axis=-1)
+    raise ValueError(f"❌ 不明な metric 指定: {metric}")
+
+
+def _tour_ends(entries, exits, order, flip):
+    """
+    並び順 order と向き flip から、各位置の描き始め S と描き終わり E を返す。
+    """
+    S = np.where(flip[:, None], exits[order], entries[order])
+    E = np.where(flip[:, None], entries[order], exits[order])
+    return S, E
+
+
+def _tour_cost(entries, exits, order, flip, metric):
+    S, E = _tour_ends(entries, exits, order, flip)
+    return float(_point_dist(E[:-1], S[1:], metric).sum())
+
+
+def _nearest_neighbor_tour(entries, exits, allow_reverse, metric):
+    """
+    curve 0 から始め、今の描き終わりに一番近い曲線（向きも含む）を順に選ぶ。
+    """
+    N = len(entries)
+    order = np.zeros(N, dtype=int)
+    flip = np.zeros(N, dtype=bool)
+    unvisited = np.ones(N, dtype=bool)
+    unvisited[0] = False
+    end = exits[0]
+
+    for p in range(1, N):
+        d_fwd = np.where(unvisited, _point_dist(end, entries, metric), np.inf)
+        j = int(np.argmin(d_fwd))
+        rev = False
+
+        if allow_reverse:
+            d_rev = np.where(unvisited, _point_dist(end, exits, metric), np.inf)
+            jr = int(np.argmin(d_rev))
+            if d_rev[jr] < d_fwd[j]:
+                j, rev = jr, True
+
+        order[p] = j
+        flip[p] = rev
+        unvisited[j] = False
+        end = entries[j] if rev else exits[j]
+
+    return order, flip
+
+
+def _two_opt_pass(entries, exits, order, flip, metric, deadline):
+    """
+    区間 [i, j] を逆順にする（各曲線の向きも反転）2-opt を 1 周。
+    向きも反転するので区間内部の移動距離は変わらず、両端の 2 本だけ比べればよい。
+    """
+    N = len(order)
+    improved = False
+
+    for i in range(1, N):
+        if time.perf_counter() > deadline:
+            break
+
+        S, E = _tour_ends(entries, exits, order, flip)
+        j = np.arange(i, N)
+        has_next = j < N - 1
+        nxt = np.minimum(j + 1, N - 1)
+
+        before = _point_dist(E[i - 1], S[i], metric) + np.where(
+            has_next, _point_dist(E[j], S[nxt], metric), 0.0)
+        after = _point_dist(E[i - 1], E[j], metric) + np.where(
+            has_next, _point_dist(S[i], S[nxt], metric), 0.0)
+
+        gain = before - after
+        best = int(np.argmax(gain))
+        if gain[best] > 1e-9:
+            jj = i + best
+            order[i:jj + 1] = order[i:jj + 1][::-1]
+            flip[i:jj + 1] = ~flip[i:jj + 1][::-1]
+            improved = True
+
+    return improved
+
+
+def _or_opt_pass(entries, exits, order, flip, allow_reverse, metric, deadline,
+                 max_seg=3):
+    """
+    連続する 1〜max_seg 本の曲線を別の位置へ移す Or-opt を 1 周。
+    allow_reverse=True なら移す区間を逆向きにした場合も比べる。
+    """
+    N = len(order)
+    improved = False
+
+    for L in range(1, max_seg + 1):
+        i = 1
+        while i + L <= N:
+            if time.perf_counter() > deadline:
+                return improved
+
+            S, E = _tour_ends(entries, exits, order, flip)
+            seg = np.arange(i, i + L)
+            seg_S, seg_E = S[i], E[i + L - 1]
+
+            # --- 区間を抜いたときに減る距離 ---
+            removed = _point_dist(E[i - 1], S[i], metric)
+            if i + L < N:
+                removed += (_point_dist(E[i + L - 1], S[i + L], metric)
+                            - _point_dist(E[i - 1], S[i + L], metric))
+
+            # --- 残りの並びの各すき間 (k, k+1) に入れたときに増える距離 ---
+            rest = np.delete(np.arange(N), seg)
+            rS, rE = S[rest], E[rest]
+            has_next = np.arange(len(rest)) < len(rest) - 1
+            nxt = np.minimum(np.arange(len(rest)) + 1, len(rest) - 1)
+            base = np.where(has_next, _point_dist(rE, rS[nxt], metric), 0.0)
+
+            def insert_cost(a, b):
+                return (_point_dist(rE, a, metric)
+                        + np.where(has_next, _point_dist(b, rS[nxt], metric), 0.0)
+                        - base)
+
+            costs = [insert_cost(seg_S, seg_E)]
+            if allow_reverse:
+                costs.append(insert_cost(seg_E, seg_S))
+            costs = np.stack(costs)
+
+            r, k = np.unravel_index(np.argmin(costs), costs.shape)
+            if removed - costs[r, k] > 1e-9:
+                seg_order = order[seg]
+                seg_flip = flip[seg]
+                if r == 1:
+                    seg_order = seg_order[::-1]
+                    seg_flip = ~seg_flip[::-1]
+
+                new_order = np.insert(order[rest], k + 1, seg_order)
+                new_flip = np.insert(flip[rest], k + 1, seg_flip)
+                order[:] = new_order
+                flip[:] = new_flip
+                improved = True
+            else:
+                i += 1
+
+    return improved
+
+
+def tsp_order_directed(entries, exits, allow_reverse=True, metric="euclid",
+                       max_rounds=50, time_limit=None):
+    """
+    曲線の描き始め entries (N, 2) と描き終わり exits (N, 2) から、
+    移動距離が短くなる順番と向きを決める。
+      1) 近傍法（向きも含めて一番近い曲線へ）
+      2) 改善が無くなるか max_rounds 周まで 2-opt / Or-opt で改善
+
+    打ち切りは周回数で決めるので、同じ入力なら毎回同じ結果になる。
+    time_limit [秒] を渡すと、それを超えた所でも打ち切る（結果は実行速度で変わりうる）。
+
+    return: order (N,) 曲線番号, flip (N,) True = 逆順で描く
+    """
+    entries = np.asarray(entries, dtype=float)
+    exits = np.asarray(exits, dtype=float)
+    N = len(entries)
+
+    if N == 0:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=bool)
+
+    order, flip = _nearest_neighbor_tour(entries, exits, allow_reverse, metric)
+
+    deadline = math.inf if time_limit is None else time.perf_counter() + time_limit
+    for _ in range(max_rounds):
+        if time.perf_counter() > deadline:
+            break
+        improved = False
+        if allow_reverse:
+            improved |= _two_opt_pass(entries, exits, order, flip, metric, deadline)
+        improved |= _or_opt_pass(entries, exits, order, flip, allow_reverse,
+                                 metric, deadline)
+        if not improved:
+            break
+
+    return order, flip
+
+
+def reorder_curves_by_tsp(curve_list, allow_reverse=True, max_rounds=50, time_limit=None):
     """
     curve_list（内部順序済み）を
     TSP順に並べ替えて返す
+    allow_reverse=True なら曲線を逆向きに描く方が近い場合は点の順を反転する
+    max_rounds 周まで 2-opt / Or-opt で移動距離を詰める（0 なら近傍法のみ）
+    time_limit [秒] は任意の上限（tsp_order_directed 参照）
+    CurveSet を渡すと、点を一括で並べ替えた CurveSet を返す
+    """
+    if isinstance(curve_list, CurveSet):
+        # 点の無い曲線は端点が無いので外す
+        curves = curve_list.take(np.flatnonzero(curve_list.lengths > 0))
+        entries = curves.points[curves.offsets[:-1]]
+        exits = curves.points[curves.offsets[1:] - 1]
+        order, flip = tsp_order_directed(entries, exits, allow_reverse=allow_reverse,
+                                         max_rounds=max_rounds, time_limit=time_limit)
+        return curves.take(order, flip)
+
+    if not curve_list:
+        return []
+
+    entries = np.array([curve["points"][0]  for curve in curve_list], dtype=float)[:, :2]
+    exits   = np.array([curve["points"][-1] for curve in curve_list], dtype=float)[:, :2]
+
+    order, flip = tsp_order_directed(entries, exits, allow_reverse=allow_reverse,
+                                     max_rounds=max_rounds, time_limit=time_limit)
+
+    result = []
+    for i, rev in zip(order, flip):
+        curve = curve_list[i]
+        if rev:
+            curve = dict(curve, points=list(curve["points"])[::-1])
+        result.append(curve)
+    return result
+
+
+
+def reorder_curves_by_joint_tsp(result, step_deg=1.8, allow_reverse=True,
+                                max_rounds=50, time_limit=None):
+    """
+    IK 後の result（points = (x, y, θL, θR)）を、関節ステップ空間の
+    チェビシェフ距離 max(|ΔstepL|, |ΔstepR|) で並べ替える。
+    ファームは 1 目標ごとに max(|ΔL|, |ΔR|) 回ステップを刻むので、
+    これがそのまま曲線間の移動時間になる。
+    角度が 1 点も無い曲線は最後にそのまま回す。
+    """
+    drawable = []
+    skipped = []
+    entries = []
+    exits = []
+
+    for curve in result:
+        angles = [p[2:4] for p in curve["points"]
+                  if len(p) >= 4 and p[2] is not None and p[3] is not None]
+        if not angles:
+            skipped.append(curve)
+            continue
+        drawable.append(curve)
+        entries.append(angles[0])
+        exits.append(angles[-1])
+
+    if not drawable:
+        return list(result)
+
+    entries = np.array(entries, dtype=float) / step_deg
+    exits = np.array(exits, dtype=float) / step_deg
+
+    order, flip = tsp_order_directed(entries, exits, allow_reverse=allow_reverse,
+                                     metric="chebyshev", max_rounds=max_rounds,
+                                     time_limit=time_limit)
+
+    out = []
+    for i, rev in zip(order, flip):
+        curve = drawable[i]
+        if rev:
+            curve = dict(curve, points=list(curve["points"])[::-1])
+        out.append(curve)
+    return out + skipped
+
+
+
+
+# =========================================================
+# 端点が近い曲線どうしをつなぐ（ペン上げ回数を減らす）
+# =========================================================
+def merge_curve_list(curve_list, tol=3.0):
     """
-    order = tsp_order(curve_list)
-    return [curve_list[i] for i in order]
+    曲線の端点（始点・終点）を KD-tree に入れ、tol 以内にある端点どうしを
+    近い順につないで 1 本の曲線にする。必要なら曲線を逆向きにする。
+    vpype の linemerge 相当をプロセス内で行う。
+
+    ・1 つの端点がつながる相手は 1 つだけ
+    ・輪になるつなぎ方はしない（union-find で判定）
+
+    return: (merged, saved)
+        merged : 入力と同じ形式（CurveSet または辞書リスト）
+        saved  : 減ったペン上げ回数（= 曲線の減った本数）
+    """
+    curves = CurveSet.from_curve_list(curve_list)
+    N = len(curves)
+
+    if N < 2 or len(curves.points) == 0:
+        return curve_list, 0
+
+    # --- 端点 2i = 曲線 i の始点, 2i+1 = 終点 ---
+    last = len(curves.points) - 1
+    ends = np.empty((2 * N, 2))
+    ends[0::2] = curves.points[np.minimum(curves.offsets[:-1], last)]
+    ends[1::2] = curves.points[np.maximum(curves.offsets[1:] - 1, 0)]
+
+    pairs = cKDTree(ends).query_pairs(tol, output_type="ndarray")
+    pairs = pairs[pairs[:, 0] // 2 != pairs[:, 1] // 2]
+
+    # 点のない曲線には端点がないのでつながない
+    empty = np.diff(curves.offsets) == 0
+    pairs = pairs[~empty[pairs[:, 0] // 2] & ~empty[pairs[:, 1] // 2]]
 
+    d = np.linalg.norm(ends[pairs[:, 0]] - ends[pairs[:, 1]], axis=1)
+    pairs = pairs[np.argsort(d, kind="stable")]
 
+    # --- 近い順に採用（端点 1 回まで・輪にしない） ---
+    link = np.full(2 * N, -1)
+    root = np.arange(N)
+
+    def find(c):
+        while root[c] != c:
+            root[c] = root[root[c]]
+            c = root[c]
+        return c
+
+    for a, b in pairs.tolist():
+        if link[a] >= 0 or link[b] >= 0:
+            continue
+        ra, rb = find(a // 2), find(b // 2)
+        if ra == rb:
+            continue
+        root[ra] = rb
+        link[a] = b
+        link[b] = a
+
+    # --- つながった曲線を順にたどって 1 本にする ---
+    visited = np.zeros(N, dtype=bool)
+    arrays = []
+    ids = []
+
+    for c in range(N):
+        if visited[c]:
+            continue
+
+        # つながりの片端（相手のいない端点）までさかのぼる
+        head, entry = c, 2 * c
+        while link[entry] >= 0:
+            prev = link[entry]
+            head = prev // 2
+            entry = prev ^ 1
+
+        chain = []
+        cur, entry = head, entry
+        while True:
+            visited[cur] = True
+            pts = curves.curve(cur)
+            chain.append(pts if entry % 2 == 0 else pts[::-1])
+            exit_ = entry ^ 1
+            nxt = link[exit_]
+            if nxt < 0:
+                break
+            cur, entry = nxt // 2, nxt
+
+        arrays.append(np.concatenate(chain))
+        ids.append(curves.curve_ids[head])
+
+    merged = CurveSet.from_arrays(arrays, ids)
+    saved = N - len(merged)
+
+    if isinstance(curve_list, CurveSet):
+        return merged, saved
+    return merged.to_curve_list(), saved
 
 
 def save_curve_list_to_csv(curve_list, path="curves.csv"):
@@ -223,7 +741,16 @@ def rotate_points(points, angle_deg):
 def rotate_curve_list(curve_list, angle_deg):
     """
     curve_list 全体を回転
+    CurveSet を渡すと全点を 1 回の行列積で回転した CurveSet を返す
     """
+    if isinstance(curve_list, CurveSet):
+        rad = math.radians(angle_deg)
+        R = np.array([
+            [ math.cos(rad), -math.sin(rad)],
+            [ math.sin(rad),  math.cos(rad)]
+        ])
+        return curve_list.with_points(curve_list.points @ R.T)
+
     new_list = []
     for curve in curve_list:
         new_pts = rotate_points(curve["points"], angle_deg)
@@ -292,11 +819,102 @@ def chaikin(points, step=2):
     return pts
 
 
+def chaikin_curveset(curves, step=2):
+    """
+    chaikin の CurveSet 版。全曲線の全線分を配列でまとめて処理する。
+    結果は曲線ごとに chaikin(points, step) をかけたものと同じ
+    （2 点未満の曲線はそのまま）。
+    """
+    curves = CurveSet.from_curve_list(curves)
+    pts = curves.points
+    offsets = curves.offsets
+
+    for _ in range(step):
+        lengths = np.diff(offsets)
+        smooth = lengths >= 2
+        curve_of = np.repeat(np.arange(len(lengths)), lengths)
+
+        # 新しい点数: n 点 → 2(n-1) 点（2 点未満はそのまま）
+        new_len = np.where(smooth, 2 * (lengths - 1), lengths)
+        new_off = np.concatenate([[0], np.cumsum(new_len)]).astype(np.int64)
+        out = np.empty((new_off[-1], 2))
+
+        # --- 線分 (i, i+1) ごとに Q, R を作る（各曲線の最後の点は線分の始点にならない） ---
+        is_seg = smooth[curve_of].copy()
+        is_seg[offsets[1:][lengths > 0] - 1] = False
+        i = np.flatnonzero(is_seg)
+        c = curve_of[i]
+        dst = new_off[c] + 2 * (i - offsets[c])
+
+        a = pts[i]
+        b = pts[i + 1]
+        out[dst] = 0.75 * a + 0.25 * b
+        out[dst + 1] = 0.25 * a + 0.75 * b
+
+        # --- 2 点未満（1 点）の曲線はそのまま写す ---
+        single = np.flatnonzero(~smooth[curve_of])
+        out[new_off[curve_of[single]]] = pts[single]
+
+        pts, offsets = out, new_off
+
+    return CurveSet(pts, offsets, curves.curve_ids)
+
+
+def chaikin_adaptive(curves, step=2, tol=0.5):
+    """
+    曲がっている所だけ角を切る Chaikin。
+    頂点 v（前後 a, b）で角を切ったときのずれは 0.125 * |a - 2v + b| なので、
+    これが tol を超える頂点だけ (0.25a + 0.75v, 0.75v + 0.25b) の 2 点に置き換える。
+    直線部分は点が増えず、端点も動かない。
+    tol は機械の分解能（mm_per_step の半分くらい）を座標の単位で渡す。
+    """
+    curves = CurveSet.from_curve_list(curves)
+    pts = curves.points
+    offsets = curves.offsets
+
+    for _ in range(step):
+        M = len(pts)
+        curve_of = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+        # 前後の点が同じ曲線にある頂点だけが角を切る対象
+        interior = np.ones(M, dtype=bool)
+        interior[offsets[:-1][np.diff(offsets) > 0]] = False
+        interior[offsets[1:][np.diff(offsets) > 0] - 1] = False
+
+        prev = np.roll(pts, 1, axis=0)
+        nxt = np.roll(pts, -1, axis=0)
+        dev = 0.125 * np.linalg.norm(prev - 2 * pts + nxt, axis=1)
+        cut = interior & (dev > tol)
+
+        if not cut.any():
+            break
+
+        count = np.where(cut, 2, 1)
+        pos = np.concatenate([[0], np.cumsum(count)])
+        out = np.empty((pos[-1], 2))
+
+        out[pos[:-1][~cut]] = pts[~cut]
+        c = np.flatnonzero(cut)
+        out[pos[c]] = 0.25 * prev[c] + 0.75 * pts[c]
+        out[pos[c] + 1] = 0.75 * pts[c] + 0.25 * nxt[c]
+
+        offsets = pos[offsets]
+        pts = out
+
+    return CurveSet(pts, offsets, curves.curve_ids)
+
+
 def convert_to_motor_coords(curve_list, height=100):
     """
     辞書形式 {"curve_id":..., "points":[...]} でも、
     単純リスト [[(x,y)...],...] でも扱える安全版
+    CurveSet を渡すと全点をまとめて変換した CurveSet を返す
     """
+    if isinstance(curve_list, CurveSet):
+        pts = curve_list.points.copy()
+        pts[:, 1] = np.abs(height - pts[:, 1])
+        return curve_list.with_points(pts)
+
     result = []
 
     for curve in curve_list:
@@ -334,7 +952,15 @@ def scale_curve_list(curve_list, target_w, target_h):
     """
     curve_list 全体を target_w × target_h に収める
     曲線ごとではなく「全体 bounding box」を見る版
+    CurveSet を渡すと全点をまとめてスケーリングした CurveSet を返す
     """
+    if isinstance(curve_list, CurveSet):
+        pts = curve_list.points
+        lo = pts.min(axis=0)
+        W, H = pts.max(axis=0) - lo
+        scale = min(target_w / W, target_h / H)
+        return curve_list.with_points((pts - lo) * scale)
+
     # --- 全体の bounding box を取得 ---
     all_pts = []
     for curve in curve_list:
@@ -366,11 +992,75 @@ def scale_curve_list(curve_list, target_w, target_h):
     return new_list
 
 
+# =========================================================
+# 回転・縮小・モーター座標反転・平行移動を 1 つの 3×3 行列にまとめる
+# =========================================================
+def build_affine_matrix(curves, rotate_deg, box_w, box_h,
+                        height=100, offset_x=0, offset_y=0):
+    """
+    rotate_curve_list → scale_curve_list → convert_to_motor_coords
+    → translate_curve_list と同じ変換を 1 つの同次座標行列にする。
+    bounding box は回転後の座標で 1 回だけ取る。
+
+    ※ convert_to_motor_coords は y → |height - y| だが、
+       縮小後の y が height 以下なら height - y と同じ（apply_affine で補正する）
+    """
+    curves = CurveSet.from_curve_list(curves)
+
+    rad = math.radians(rotate_deg)
+    R = np.array([
+        [ math.cos(rad), -math.sin(rad), 0.0],
+        [ math.sin(rad),  math.cos(rad), 0.0],
+        [ 0.0,            0.0,           1.0]
+    ])
+
+    # --- 回転後の bounding box（1 回の縮約） ---
+    rot = curves.points @ R[:2, :2].T
+    lo = rot.min(axis=0)
+    W, H = rot.max(axis=0) - lo
+    scale = min(box_w / W, box_h / H)
+
+    # 原点に寄せてスケール
+    S = np.array([
+        [scale, 0.0,   -lo[0] * scale],
+        [0.0,   scale, -lo[1] * scale],
+        [0.0,   0.0,   1.0]
+    ])
+
+    # モーター座標（y 反転）→ 平行移動
+    F = np.array([
+        [1.0,  0.0, offset_x],
+        [0.0, -1.0, height + offset_y],
+        [0.0,  0.0, 1.0]
+    ])
+
+    return F @ S @ R
+
+
+def apply_affine(curves, M, offset_y=None):
+    """
+    CurveSet の全点に 3×3 行列 M を 1 回の行列積でかける。
+    offset_y を渡すと convert_to_motor_coords の |height - y| も再現する
+    （y = |y - offset_y| + offset_y。範囲内なら何も変わらない）。
+    """
+    curves = CurveSet.from_curve_list(curves)
+    pts = curves.points @ M[:2, :2].T + M[:2, 2]
+
+    if offset_y is not None:
+        pts[:, 1] = np.abs(pts[:, 1] - offset_y) + offset_y
+
+    return curves.with_points(pts)
+
+
 def round_curve_list(curve_list, ndigits=3):
     """
     全ての座標を小数点以下 ndigits 桁に丸める
     （内部計算は float のまま保持）
+    CurveSet を渡すと全点をまとめて丸めた CurveSet を返す
     """
+    if isinstance(curve_list, CurveSet):
+        return curve_list.with_points(np.round(curve_list.points, ndigits))
+
     new_list = []
     for curve in curve_list:
         pts = curve["points"]
@@ -394,7 +1084,11 @@ def translate_points(points, dx, dy):
 def translate_curve_list(curve_list, dx, dy):
     """
     curve_list 全体を平行移動
+    CurveSet を渡すと全点をまとめて移動した CurveSet を返す
     """
+    if isinstance(curve_list, CurveSet):
+        return curve_list.with_points(curve_list.points + np.array([dx, dy], dtype=float))
+
     new_list = []
     for curve in curve_list:
         new_list.append({
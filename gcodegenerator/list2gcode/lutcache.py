@@ -0,0 +1,330 @@
+# list2gcode/lutcache.py
+# =========================================
+#  LUT キャッシュ（リンク寸法ごとに自動生成 → mmap 読み込み）
+# =========================================
+
+import hashlib
+import json
+import multiprocessing
+import os
+import pickle
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from numpy.lib.format import open_memmap
+from scipy.spatial import cKDTree
+
+from .makegcode import STEP_DEG, forward_full_arm_batch, arm_safety_mask, build_grid_lut
+
+BASE_DIR = Path(__file__).resolve().parent
+LUT_CACHE_DIR = BASE_DIR / "lut_cache"
+
+# arm_safety_mask の条件を変えたらこの番号を上げる（古いキャッシュは自動で作り直される）
+# 2: リンク干渉チェックを追加
+SAFETY_FILTER_VERSION = 2
+
+# 格子 LUT の持ち方を変えたらこの番号を上げる
+# 2: マスごとの候補を k 個固定 → max_error_mm + 半対角線 以内を全部（CSR）
+GRID_FORMAT_VERSION = 2
+
+# microsteps > 1 のときの 1 マスの候補数の上限（k="auto"）。
+# 1/16 ステップで全部持つと idx が約 5400 万個（構築 1GB 超、2000 点の引きに数秒）になる。
+# 1/16 でも 1 マス（中心から約 1mm）に入る行は 200 前後なので、256 あれば
+# genrad の k=20 近傍はほぼ取りこぼさない
+GRID_K_CAPPED = 256
+
+_ARRAYS = ("theta_L", "theta_R", "xy", "idx", "idx_ptr", "shape", "origin")
+
+# A4988 の MS1〜MS3 で選べる分割数
+MICROSTEPS = (1, 2, 4, 8, 16)
+
+# これより多い組み合わせはプロセスプールで分割計算する
+_POOL_MIN_EVALS = 1_000_000
+
+
+def lut_cache_key(l1, l2, d, offset, angle_step,
+                  cell_mm=1.0, k=None, max_error_mm=2.0,
+                  safety_version=SAFETY_FILTER_VERSION):
+    """
+    LUT を決めるパラメータから、キャッシュのディレクトリ名（ハッシュ）を作る。
+    """
+    params = {
+        "l1": float(l1),
+        "l2": float(l2),
+        "d": float(d),
+        "offset": float(offset),
+        "angle_step": float(angle_step),
+        "cell_mm": float(cell_mm),
+        "k": None if k is None else int(k),
+        "max_error_mm": float(max_error_mm),
+        "safety_version": int(safety_version),
+        "grid_format": GRID_FORMAT_VERSION,
+    }
+    text = json.dumps(params, sort_keys=True)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16], params
+
+
+def angle_step_for(microsteps):
+    """
+    マイクロステップ分割数 → LUT の角度刻み [度]
+    """
+    if microsteps not in MICROSTEPS:
+        raise ValueError(f"❌ 不明な microsteps 指定: {microsteps}（{MICROSTEPS} のどれか）")
+    return STEP_DEG / microsteps
+
+
+def grid_k_for(microsteps):
+    """
+    k="auto" のときの 1 マスの候補数：1 ステップなら全部（None）、細かい刻みなら上限付き
+    """
+    return None if microsteps == 1 else GRID_K_CAPPED
+
+
+def build_angle_table(l1=65.0, l2=85.0, d=50.0, offset=25.0, angle_step=1.8):
+    """
+    rad2csv.generate_angle_csv と同じ表（安全な角度だけ、リンク干渉も除く）を配列で作る。
+    return: theta_L, theta_R, xy
+    """
+    angles = np.arange(-180, 180 + 1e-6, angle_step)
+    return _angle_table_rows(angles, angles, l1, l2, d, offset)
+
+
+def _angle_table_rows(angles_L, angles_R, l1, l2, d, offset):
+    """
+    angles_L × angles_R の全組み合わせを順運動し、安全なものだけ返す。
+    """
+    thL, thR = np.meshgrid(angles_L, angles_R, indexing="ij")
+    thL = thL.ravel()
+    thR = thR.ravel()
+
+    P_tip = forward_full_arm_batch(thL, thR, l1=l1, l2=l2, d=d, offset=offset)[0]
+    ok = arm_safety_mask(thL, thR, l1=l1, l2=l2, d=d, offset=offset)
+
+    return thL[ok], thR[ok], P_tip[ok]
+
+
+def _table_chunk(args):
+    """
+    プロセスプール用：θL の一部の行だけ計算して chunk ファイルに書き出す。
+    return: (chunk ファイル, 行数)
+    """
+    chunk_path, angles_L, angles_R, l1, l2, d, offset = args
+    thL, thR, xy = _angle_table_rows(angles_L, angles_R, l1, l2, d, offset)
+    np.save(chunk_path, np.column_stack([thL, thR, xy]))
+    return chunk_path, len(thL)
+
+
+def build_angle_table_chunked(out_dir, l1=65.0, l2=85.0, d=50.0, offset=25.0,
+                              angle_step=1.8, chunk_rows=64, workers=None):
+    """
+    build_angle_table の大規模版（1/16 ステップだと 3201×3201 ≒ 1000 万通り）。
+    θL の行を chunk_rows ずつに分けてプロセスプールで計算し、
+    結果は chunk ごとにディスクへ書いてから out_dir の .npy（mmap）へ流し込む。
+    表全体を一度にメモリへ載せることはない。
+
+    return: theta_L, theta_R, xy（out_dir の .npy を mmap したもの）
+    """
+    out_dir = Path(out_dir)
+    chunk_dir = out_dir / "chunks"
+    chunk_dir.mkdir(parents=True, exist_ok=True)
+
+    angles = np.arange(-180, 180 + 1e-6, angle_step)
+    jobs = [
+        (str(chunk_dir / f"{i:05d}.npy"), angles[i:i + chunk_rows], angles, l1, l2, d, offset)
+        for i in range(0, len(angles), chunk_rows)
+    ]
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if workers > 1 and len(angles) ** 2 >= _POOL_MIN_EVALS:
+        # spawn だと main.py が子プロセスで再実行されるので、使えるなら fork
+        methods = multiprocessing.get_all_start_methods()
+        ctx = multiprocessing.get_context("fork" if "fork" in methods else None)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+            chunks = list(pool.map(_table_chunk, jobs))
+    else:
+        chunks = [_table_chunk(job) for job in jobs]
+
+    # --- chunk を順番に結合（1 chunk ずつ読む） ---
+    total = sum(n for _, n in chunks)
+    theta_L = open_memmap(out_dir / "theta_L.npy", mode="w+", dtype=np.float64, shape=(total,))
+    theta_R = open_memmap(out_dir / "theta_R.npy", mode="w+", dtype=np.float64, shape=(total,))
+    xy = open_memmap(out_dir / "xy.npy", mode="w+", dtype=np.float64, shape=(total, 2))
+
+    pos = 0
+    for chunk_path, n in chunks:
+        rows = np.load(chunk_path)
+        theta_L[pos:pos + n] = rows[:, 0]
+        theta_R[pos:pos + n] = rows[:, 1]
+        xy[pos:pos + n] = rows[:, 2:4]
+        pos += n
+
+    for a in (theta_L, theta_R, xy):
+        a.flush()
+    shutil.rmtree(chunk_dir)
+
+    return theta_L, theta_R, xy
+
+
+def build_safety_mask_chunked(out_path, l1=65.0, l2=85.0, d=50.0, offset=25.0,
+                              angle_step=1.8, chunk_rows=64):
+    """
+    radcheck 用の安全マップ（θL × θR の bool）を θL の chunk_rows 行ずつ計算し、
+    out_path の .npy（mmap）へ直接書く。1/16 ステップ（3201×3201）でも全体を一度に計算しない。
+    mask[i, j] : θL = -180 + i*step, θR = -180 + j*step が arm_safety_mask を通るか
+    """
+    n = int(round(360 / angle_step)) + 1
+    angles = -180 + np.arange(n) * angle_step
+
+    tmp = Path(out_path).with_name(f"{Path(out_path).stem}.tmp{os.getpid()}.npy")
+    mask = open_memmap(tmp, mode="w+", dtype=bool, shape=(n, n))
+    for i in range(0, n, chunk_rows):
+        thL, thR = np.meshgrid(angles[i:i + chunk_rows], angles, indexing="ij")
+        mask[i:i + chunk_rows] = arm_safety_mask(thL, thR, l1=l1, l2=l2, d=d, offset=offset)
+    mask.flush()
+    del mask
+    os.replace(tmp, out_path)
+
+
+def _build_cache(path, params, workers=None):
+    """
+    LUT を作って path に .npy で保存する。
+    途中で落ちても壊れたキャッシュが残らないよう、一時ディレクトリに書いてから rename する。
+    一時ディレクトリはプロセスごとに分けるので、同じ LUT を複数のプロセスが
+    同時に作っても混ざらない（先に rename できた方を全員が使う）。
+    """
+    tmp = path.with_name(f"{path.name}.tmp{os.getpid()}")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+
+    # 角度表は chunk ごとに tmp へ直接書き出す
+    theta_L, theta_R, xy = build_angle_table_chunked(
+        tmp,
+        l1=params["l1"], l2=params["l2"], d=params["d"],
+        offset=params["offset"], angle_step=params["angle_step"],
+        workers=workers,
+    )
+    grid = build_grid_lut(
+        theta_L, theta_R, xy,
+        cell_mm=params["cell_mm"], k=params["k"],
+        max_error_mm=params["max_error_mm"],
+    )
+    del theta_L, theta_R, xy
+
+    for name in ("idx", "idx_ptr", "shape", "origin"):
+        np.save(tmp / f"{name}.npy", np.ascontiguousarray(grid[name]))
+    del grid
+
+    build_safety_mask_chunked(
+        tmp / "safety_mask.npy",
+        l1=params["l1"], l2=params["l2"], d=params["d"],
+        offset=params["offset"], angle_step=params["angle_step"],
+    )
+
+    with open(tmp / "meta.json", "w", encoding="utf-8") as f:
+        json.dump(params, f, indent=2)
+
+    # meta.json の無い path は、rename 方式にする前の書きかけなので消してよい
+    if path.exists() and not (path / "meta.json").exists():
+        shutil.rmtree(path, ignore_errors=True)
+
+    try:
+        # ディレクトリの rename は置き場所が空いているときだけ成功する
+        os.rename(tmp, path)
+    except OSError:
+        # 別のプロセスが先に同じキャッシュを置いた → そちらを使う
+        shutil.rmtree(tmp, ignore_errors=True)
+        if not (path / "meta.json").exists():
+            raise
+
+
+_LOADED = {}
+
+
+def load_lut_cached(l1=65.0, l2=85.0, d=50.0, offset=25.0, angle_step=None,
+                    cell_mm=1.0, k="auto", max_error_mm=2.0,
+                    microsteps=1, workers=None,
+                    cache_dir=LUT_CACHE_DIR):
+    """
+    リンク寸法などに対応する LUT をキャッシュから読み込む。
+    無ければ（寸法を変えた場合も）その場で作って保存する。
+    配列は mmap で開くので、2 回目以降の起動はほぼ一瞬。
+
+    angle_step を省略すると STEP_DEG / microsteps（1/2〜1/16 ステップ）になる。
+    k=None なら各マスに届きうる LUT 行を全部持つ（KD-tree と同じ候補が引ける）。
+    k="auto"（既定）は grid_k_for(microsteps)：1 ステップなら全部、
+    1/2〜1/16 ステップは GRID_K_CAPPED 個までに制限する（格子が大きくなりすぎないように）。
+
+    return: dict（lookup_grid_lut にそのまま渡せる）
+        theta_L, theta_R, xy, idx, idx_ptr, shape, origin, safety_mask, cell_mm, meta
+    """
+    if angle_step is None:
+        angle_step = angle_step_for(microsteps)
+    if k == "auto":
+        k = grid_k_for(microsteps)
+
+    key, params = lut_cache_key(l1, l2, d, offset, angle_step,
+                                cell_mm=cell_mm, k=k, max_error_mm=max_error_mm)
+    path = Path(cache_dir) / key
+
+    # 同じプロセスで 2 回目以降はファイルも開き直さない
+    if path in _LOADED:
+        return _LOADED[path]
+
+    if not (path / "meta.json").exists():
+        print("LUT キャッシュを作成中:", path)
+        _build_cache(path, params, workers=workers)
+
+    # 安全マップを持たない古いキャッシュには後から足す
+    if not (path / "safety_mask.npy").exists():
+        build_safety_mask_chunked(
+            path / "safety_mask.npy",
+            l1=params["l1"], l2=params["l2"], d=params["d"],
+            offset=params["offset"], angle_step=params["angle_step"],
+        )
+
+    lut = {name: np.load(path / f"{name}.npy", mmap_mode="r") for name in _ARRAYS}
+    lut["safety_mask"] = np.load(path / "safety_mask.npy", mmap_mode="r")
+    lut["cell_mm"] = params["cell_mm"]
+    lut["meta"] = params
+    lut["path"] = path
+    _LOADED[path] = lut
+    return lut
+
+
+_KDTREES = {}
+
+# これより行数の多い LUT（1/8, 1/16 ステップ）は木を pickle しない。
+# pickle を読むと xy の複製がメモリに載るので、mmap の上に毎回木を作る方が軽い
+_PICKLE_MAX_ROWS = 2_000_000
+
+
+def kdtree_from_lut(lut):
+    """
+    キャッシュの xy から cKDTree を作る（load_kdtree と同じ形で返す）。
+    作った木は LUT と同じキャッシュディレクトリに kdtree.pkl として保存し、
+    次の起動からはそれを読む（同じプロセス内ではメモリ上のものを使い回す）。
+    木は xy を複製せず mmap をそのまま参照するので、表全体はメモリに載らない。
+    """
+    path = lut.get("path")
+    if path is None:
+        return cKDTree(lut["xy"], copy_data=False), lut["theta_L"], lut["theta_R"]
+
+    if path not in _KDTREES:
+        pkl = path / "kdtree.pkl"
+        if pkl.exists():
+            with open(pkl, "rb") as f:
+                tree = pickle.load(f)
+        else:
+            tree = cKDTree(lut["xy"], copy_data=False)
+            if len(lut["xy"]) <= _PICKLE_MAX_ROWS:
+                tmp = pkl.with_name(f"kdtree.pkl.tmp{os.getpid()}")
+                with open(tmp, "wb") as f:
+                    pickle.dump(tree, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, pkl)
+        _KDTREES[path] = tree
+
+    return _KDTREES[path], lut["theta_L"], lut["theta_R"]
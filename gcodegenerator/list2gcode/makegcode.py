@@ -6,6 +6,9 @@ import csv
 import numpy as np
 import matplotlib.pyplot as plt
 import pickle
+from scipy.spatial import cKDTree
+
+STEP_DEG = 1.8  # 1ステップ = 1.8度（フルステップ）
 
 # ============================================================
 #  FK-1 : 第一リンク（l1）先端座標を求める
@@ -169,6 +172,215 @@ def plot_full_arm(theta_l_deg, theta_r_deg, l1=65, l2=85, d=50, offset=25, plot=
     # --- 順運動の結果を返す ---    
     return P_tip, P, L_tip, R_tip
 
+
+# ============================================================
+#  FK-batch : 角度配列をまとめて順運動（plot_full_arm の一括版）
+# ============================================================
+def forward_full_arm_batch(theta_l_deg, theta_r_deg, l1=65, l2=85, d=50, offset=25):
+    """
+    θL, θR の配列（同じ形）をまとめて順運動する。
+    plot_full_arm(plot=False) を全要素に呼んだのと同じ結果を返す。
+
+    return:
+        P_tip, P, L_tip, R_tip : (..., 2) の配列
+        valid                  : (...) の bool（plot_full_arm が None を返す所は False）
+    """
+    tl = np.radians(np.asarray(theta_l_deg, dtype=float))
+    tr = np.radians(np.asarray(theta_r_deg, dtype=float))
+
+    # --- 第一リンク先端 ---
+    L_tip = np.stack([-d/2 - l1 * np.cos(tl), l1 * np.sin(tl)], axis=-1)
+    R_tip = np.stack([ d/2 + l1 * np.cos(tr), l1 * np.sin(tr)], axis=-1)
+
+    # --- 第二リンク交点 P（compute_pen_position と同じ式） ---
+    diff = R_tip - L_tip
+    dist = np.hypot(diff[..., 0], diff[..., 1])
+
+    # d > 2*l2 は交点なし、d == 0 は方向が決まらない
+    valid = (dist <= 2*l2) & (dist > 0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        a = dist / 2
+        h = np.sqrt(l2**2 - a*a)
+        mid = L_tip + diff * (a / dist)[..., None]
+        r = np.stack([-diff[..., 1], diff[..., 0]], axis=-1) * (h / dist)[..., None]
+
+    p1 = mid + r
+    p2 = mid - r
+    P = np.where((p1[..., 1] >= p2[..., 1])[..., None], p1, p2)
+
+    # --- 実ペン先（延長） ---
+    dir_vec = P - R_tip
+    norm = np.hypot(dir_vec[..., 0], dir_vec[..., 1])
+    valid &= ~(norm < 1e-8)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        P_tip = P + dir_vec / norm[..., None] * offset
+
+    return P_tip, P, L_tip, R_tip, valid
+
+
+# ============================================================
+#  安全チェック（配列版, rad2csv.generate_angle_csv と同じ条件）
+# ============================================================
+def safe_arm_mask(P, L_tip, R_tip, d=50):
+    """
+    LUT 作成時の安全チェックを bool マスクとして一括評価する。
+    True = すべてのチェックを通過
+    """
+    Lx, Ly = L_tip[..., 0], L_tip[..., 1]
+    Rx, Ry = R_tip[..., 0], R_tip[..., 1]
+    Px = P[..., 0]
+
+    left_motor_x = -d/2
+    right_motor_x = d/2
+
+    with np.errstate(invalid="ignore"):
+        # 第二関節の左右関係
+        ok = (Lx + 1 < Px) & (Px < Rx - 1)
+
+        # 両方の第一関節が低い（危険領域）
+        ok &= ~((Ly < 20) & (Ry < 20))
+
+        # 左第一関節が右モーター側へ大きく侵入したらNG
+        ok &= ~((Lx > right_motor_x + 10) & (Ly < -10))
+
+        # 右第一関節が左側へ大きく侵入したらNG
+        ok &= ~((Rx < left_motor_x - 10) & (Ry < -10))
+
+    return ok
+
+
+# ============================================================
+#  リンクどうしの干渉（線分の交差）
+# ============================================================
+def _segments_cross(a0, a1, b0, b1):
+    """
+    線分 a0-a1 と b0-b1 が交差するかを配列でまとめて判定する（端点の接触は含めない）。
+    """
+    def cross(o, p, q):
+        return ((p[..., 0] - o[..., 0]) * (q[..., 1] - o[..., 1])
+                - (p[..., 1] - o[..., 1]) * (q[..., 0] - o[..., 0]))
+
+    d1 = cross(b0, b1, a0)
+    d2 = cross(b0, b1, a1)
+    d3 = cross(a0, a1, b0)
+    d4 = cross(a0, a1, b1)
+
+    with np.errstate(invalid="ignore"):
+        return (d1 * d2 < 0) & (d3 * d4 < 0)
+
+
+def links_collide(P_tip, P, L_tip, R_tip, d=50):
+    """
+    関節を共有しないリンクどうしが交差していれば True。
+      左第一リンク (M_L→L_tip) × 右第一リンク (M_R→R_tip)
+      左第一リンク (M_L→L_tip) × 右第二リンク＋ペン (R_tip→P_tip)
+      右第一リンク (M_R→R_tip) × 左第二リンク (L_tip→P)
+    """
+    M_L = np.broadcast_to(np.array([-d/2, 0.0]), L_tip.shape)
+    M_R = np.broadcast_to(np.array([ d/2, 0.0]), R_tip.shape)
+
+    hit = _segments_cross(M_L, L_tip, M_R, R_tip)
+    hit |= _segments_cross(M_L, L_tip, R_tip, P_tip)
+    hit |= _segments_cross(M_R, R_tip, L_tip, P)
+    return hit
+
+
+def arm_safety_mask(theta_l_deg, theta_r_deg, l1=65, l2=85, d=50, offset=25):
+    """
+    角度配列に対して、順運動できる & 安全チェック & リンク干渉なし をまとめて判定する。
+    LUT 作成と radcheck の両方がこの条件を使う。
+    """
+    P_tip, P, L_tip, R_tip, valid = forward_full_arm_batch(
+        theta_l_deg, theta_r_deg, l1=l1, l2=l2, d=d, offset=offset
+    )
+    ok = valid & safe_arm_mask(P, L_tip, R_tip, d=d)
+    ok &= ~links_collide(P_tip, P, L_tip, R_tip, d=d)
+    return ok
+
+
+# ============================================================
+#  IK-batch : 実ペン先（25mm延長）を目標とした解析解
+# ============================================================
+def _circle_intersections(c1, r1, c2, r2):
+    """
+    円 (c1, r1) と円 (c2, r2) の交点 2 つを配列でまとめて求める。
+    c1, c2 : (N, 2)
+    return: pa, pb : (N, 2), ok : (N,) 交点が存在するか
+    """
+    diff = c2 - c1
+    dist = np.hypot(diff[..., 0], diff[..., 1])
+    ok = (dist > 1e-12) & (dist <= r1 + r2) & (dist >= np.abs(r1 - r2))
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        a = (r1*r1 - r2*r2 + dist*dist) / (2*dist)
+        h = np.sqrt(np.clip(r1*r1 - a*a, 0.0, None))
+        unit = diff / dist[..., None]
+
+    mid = c1 + unit * a[..., None]
+    perp = np.stack([-unit[..., 1], unit[..., 0]], axis=-1) * h[..., None]
+
+    return mid + perp, mid - perp, ok
+
+
+def ik_pen_tip_batch(targets, l1=65.0, l2=85.0, d=50.0, offset=25.0,
+                     tol_mm=1e-6, check_safety=True):
+    """
+    実ペン先 (x, y) の配列 (N, 2) から、全ブランチの (θL, θR) を一括で求める。
+
+    実ペン先 T は R_tip → P の延長線上にあるので
+        |T - R_tip| = l2 + offset
+    が成り立つ。よって
+        R_tip = 円(右モーター, l1) ∩ 円(T, l2+offset)   … 2 解
+        P     = R_tip + (T - R_tip) * l2 / (l2+offset)
+        L_tip = 円(左モーター, l1) ∩ 円(P, l2)          … 2 解
+    の 4 組が閉形式で得られる（LUT の分解能に依存しない）。
+
+    return:
+        thetas : (N, 4, 2) [θL, θR]（度, -180〜180）
+        valid  : (N, 4) bool
+                 順運動で T が再現でき（P の上下解が FK と一致）、
+                 check_safety=True なら安全チェック・リンク干渉チェックも通過したもの
+    """
+    T = np.asarray(targets, dtype=float).reshape(-1, 2)
+    N = len(T)
+
+    M_L = np.broadcast_to(np.array([-d/2, 0.0]), T.shape)
+    M_R = np.broadcast_to(np.array([ d/2, 0.0]), T.shape)
+
+    thetas = np.full((N, 4, 2), np.nan)
+    valid = np.zeros((N, 4), dtype=bool)
+
+    R_a, R_b, ok_R = _circle_intersections(M_R, l1, T, l2 + offset)
+
+    for i, R_tip in enumerate((R_a, R_b)):
+        P = R_tip + (T - R_tip) * (l2 / (l2 + offset))
+        L_a, L_b, ok_L = _circle_intersections(M_L, l1, P, l2)
+
+        thR = np.degrees(np.arctan2(R_tip[:, 1], R_tip[:, 0] - d/2))
+
+        for j, L_tip in enumerate((L_a, L_b)):
+            thL = np.degrees(np.arctan2(L_tip[:, 1], -(L_tip[:, 0] + d/2)))
+            k = 2*i + j
+            thetas[:, k, 0] = thL
+            thetas[:, k, 1] = thR
+            valid[:, k] = ok_R & ok_L
+
+    # --- 順運動で検算（FK は P の上側解を選ぶので、下側解のブランチはここで落ちる） ---
+    P_tip, P, L_tip, R_tip, ok_fk = forward_full_arm_batch(
+        thetas[..., 0], thetas[..., 1], l1=l1, l2=l2, d=d, offset=offset
+    )
+    with np.errstate(invalid="ignore"):
+        err = np.hypot(P_tip[..., 0] - T[:, None, 0], P_tip[..., 1] - T[:, None, 1])
+        valid &= ok_fk & (err <= tol_mm)
+
+    if check_safety:
+        valid &= safe_arm_mask(P, L_tip, R_tip, d=d)
+        valid &= ~links_collide(P_tip, P, L_tip, R_tip, d=d)
+
+    return thetas, valid
+
 # =========================================
 #  🔵 新規追加: LUT 読み込み
 # =========================================
@@ -195,6 +407,224 @@ def load_kdtree(path="lut_tree.pkl"):
     return tree, thL, thR
 
 
+# =========================================
+#  格子 LUT（xy ラスタ → 角度候補）
+# =========================================
+def build_grid_lut(theta_L, theta_R, xy, cell_mm=1.0, k=None, max_error_mm=2.0,
+                   chunk_cells=4096):
+    """
+    順運動テーブル（θL, θR, x, y）から、xy を cell_mm 角のマス目で区切った
+    逆引き LUT を作る。各マスには、マス内のどの点からでも max_error_mm 以内に
+    入りうる LUT 行（中心から max_error_mm + 半対角線 以内）を全部持たせる。
+    マスごとに個数が違うので、CSR 形式（行番号を 1 本に連結 + 区切り）で持つ。
+    k を指定すると、各マスは中心に近い k 個までに制限する（細かい刻みの LUT 用）。
+
+    xy が mmap でも、木は xy を複製せずに作り、マスは chunk_cells ずつ引く。
+
+    return: dict
+        origin   : (x0, y0) マス (0, 0) の左下
+        cell_mm  : マスの大きさ
+        shape    : (ny, nx)
+        idx      : (総数,) int32  LUT 行番号をマス順に連結したもの
+        idx_ptr  : (ny*nx + 1,) int64  マス c の候補は idx[idx_ptr[c]:idx_ptr[c+1]]
+        theta_L, theta_R, xy : 元のテーブル
+    """
+    theta_L = np.asarray(theta_L, dtype=float)
+    theta_R = np.asarray(theta_R, dtype=float)
+    xy = np.asarray(xy, dtype=float)
+
+    # マスの外側まで max_error_mm だけ広げておく
+    lo = xy.min(axis=0) - max_error_mm
+    hi = xy.max(axis=0) + max_error_mm
+    nx, ny = np.ceil((hi - lo) / cell_mm).astype(int)
+
+    cx = lo[0] + (np.arange(nx) + 0.5) * cell_mm
+    cy = lo[1] + (np.arange(ny) + 0.5) * cell_mm
+    centers = np.stack(np.meshgrid(cx, cy), axis=-1).reshape(-1, 2)
+
+    # マス内のどの点からでも max_error_mm 以内に入りうる候補だけ残す
+    reach = max_error_mm + cell_mm * np.sqrt(0.5)
+
+    tree = cKDTree(xy, copy_data=False)
+
+    counts = np.zeros(len(centers), dtype=np.int64)
+    parts = []
+    for a in range(0, len(centers), chunk_cells):
+        c = centers[a:a + chunk_cells]
+        if k is None:
+            found = tree.query_ball_point(c, reach, workers=-1)
+            n = np.array([len(f) for f in found], dtype=np.int64)
+            rows = np.concatenate([np.asarray(f, dtype=np.int64) for f in found] + [np.zeros(0, np.int64)])
+        else:
+            _, i = tree.query(c, k=k, distance_upper_bound=reach, workers=-1)
+            i = np.asarray(i).reshape(len(c), k)
+            has = i < len(xy)
+            n = has.sum(axis=1)
+            rows = i[has]
+        counts[a:a + chunk_cells] = n
+        parts.append(rows.astype(np.int32))
+
+    idx_ptr = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+    return {
+        "origin": lo,
+        "cell_mm": float(cell_mm),
+        "shape": np.array([ny, nx], dtype=np.int64),
+        "idx": np.concatenate(parts),
+        "idx_ptr": idx_ptr,
+        "theta_L": theta_L,
+        "theta_R": theta_R,
+        "xy": xy,
+    }
+
+
+def save_grid_lut(grid, path="lut_grid.npz"):
+    np.savez(
+        path,
+        origin=grid["origin"],
+        cell_mm=grid["cell_mm"],
+        shape=grid["shape"],
+        idx=grid["idx"],
+        idx_ptr=grid["idx_ptr"],
+        theta_L=grid["theta_L"],
+        theta_R=grid["theta_R"],
+        xy=grid["xy"],
+    )
+
+
+def load_grid_lut(path="lut_grid.npz"):
+    with np.load(path) as z:
+        return {
+            "origin": z["origin"],
+            "cell_mm": float(z["cell_mm"]),
+            "shape": z["shape"],
+            "idx": z["idx"],
+            "idx_ptr": z["idx_ptr"],
+            "theta_L": z["theta_L"],
+            "theta_R": z["theta_R"],
+            "xy": z["xy"],
+        }
+
+
+def _grid_cells(grid, pts):
+    """
+    点列 (N, 2) → マス番号 (N,)（格子の外は -1）
+    """
+    ny, nx = (int(v) for v in grid["shape"])
+    cell = np.floor((pts - grid["origin"]) / grid["cell_mm"]).astype(np.int64)
+    inside = (cell[:, 0] >= 0) & (cell[:, 0] < nx) & (cell[:, 1] >= 0) & (cell[:, 1] < ny)
+    return np.where(inside, cell[:, 1] * nx + cell[:, 0], -1)
+
+
+def _refine_linear(thL, thR, targets, l1=65, l2=85, d=50, offset=25, h=0.1):
+    """
+    LUT の角度 (θL, θR) を、順運動の局所線形近似で 1 回だけ補正する。
+    （LUT 格子の間を双一次で埋めるのと同じ働き）
+    誤差が小さくならなかった所は元の角度を残す。
+    """
+    P0 = forward_full_arm_batch(thL, thR, l1=l1, l2=l2, d=d, offset=offset)[0]
+    PL = forward_full_arm_batch(thL + h, thR, l1=l1, l2=l2, d=d, offset=offset)[0]
+    PR = forward_full_arm_batch(thL, thR + h, l1=l1, l2=l2, d=d, offset=offset)[0]
+
+    J = np.stack([(PL - P0) / h, (PR - P0) / h], axis=-1)   # (..., 2, 2)
+    r = targets - P0
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        det = J[..., 0, 0] * J[..., 1, 1] - J[..., 0, 1] * J[..., 1, 0]
+        dL = ( J[..., 1, 1] * r[..., 0] - J[..., 0, 1] * r[..., 1]) / det
+        dR = (-J[..., 1, 0] * r[..., 0] + J[..., 0, 0] * r[..., 1]) / det
+
+    newL = thL + dL
+    newR = thR + dR
+    P1 = forward_full_arm_batch(newL, newR, l1=l1, l2=l2, d=d, offset=offset)[0]
+
+    r1 = targets - P1
+    with np.errstate(invalid="ignore"):
+        better = np.hypot(r1[..., 0], r1[..., 1]) < np.hypot(r[..., 0], r[..., 1])
+
+    return np.where(better, newL, thL), np.where(better, newR, thR)
+
+
+def lookup_grid_lut(grid, points, max_error_mm=2.0, refine=False, k=20,
+                    chunk_cands=2_000_000):
+    """
+    格子 LUT から、点列 (N, 2) の角度候補をまとめて引く。
+    マス番号は整数の割り算だけで決まるので、木の探索は不要。
+    マスの候補すべてについて実際の誤差を測り、近い順に k 個返す。
+    （genrad_kdtree の tree.query(k=20) と同じ候補になる）
+
+    return:
+        cand_L, cand_R : (N, k) 角度候補（実際の誤差が小さい順）
+        err            : (N, k) LUT 上の位置誤差 [mm]（refine 前の値、候補なし → inf）
+        valid          : (N, k) bool（err <= max_error_mm）
+    """
+    pts = np.asarray(points, dtype=float).reshape(-1, 2)
+    n = len(pts)
+    idx_ptr = grid["idx_ptr"]
+
+    cell = _grid_cells(grid, pts)
+    inside = cell >= 0
+    first = np.where(inside, idx_ptr[np.maximum(cell, 0)], 0)
+    count = np.where(inside, idx_ptr[np.maximum(cell, 0) + 1] - first, 0)
+
+    cand_L = np.zeros((n, k))
+    cand_R = np.zeros((n, k))
+    err = np.full((n, k), np.inf)
+
+    # 候補の総数が chunk_cands 程度になるように点を区切る
+    bounds = np.searchsorted(np.cumsum(count), np.arange(chunk_cands, count.sum(), chunk_cands))
+    for a, b in zip(np.concatenate([[0], bounds]), np.concatenate([bounds, [n]])):
+        cnt = count[a:b]
+        total = int(cnt.sum())
+        if total == 0:
+            continue
+
+        # 点 p の j 番目の候補 → idx[first[p] + j]（ラグ配列を 1 本にほどく）
+        owner = np.repeat(np.arange(a, b), cnt)
+        start = np.concatenate([[0], np.cumsum(cnt)[:-1]])
+        rows = grid["idx"][first[owner] + np.arange(total) - np.repeat(start, cnt)]
+
+        cand_xy = np.asarray(grid["xy"][rows])
+        e = np.hypot(cand_xy[:, 0] - pts[owner, 0], cand_xy[:, 1] - pts[owner, 1])
+
+        # 点ごとに誤差の小さい順 → 先頭 k 個
+        order = np.lexsort((e, owner))
+        rank = np.arange(total) - np.repeat(start, cnt)
+        keep = rank < k
+        o = order[keep]
+        p, j = owner[o], rank[keep]
+
+        cand_L[p, j] = grid["theta_L"][rows[o]]
+        cand_R[p, j] = grid["theta_R"][rows[o]]
+        err[p, j] = e[o]
+
+    valid = err <= max_error_mm
+
+    if refine and valid.any():
+        targets = np.broadcast_to(pts[:, None, :], cand_L.shape + (2,))
+        rL, rR = _refine_linear(cand_L[valid], cand_R[valid], targets[valid])
+        cand_L[valid] = rL
+        cand_R[valid] = rR
+
+    return cand_L, cand_R, err, valid
+
+
+
+# =========================================
+#  到達可能判定（IK と同じ基準）
+# =========================================
+def classify_reachable(grid, points, max_error_mm=2.0, k=20, microsteps=1):
+    """
+    点列 (N, 2) が到達可能かを一括判定する。
+    genrad_kdtree と同じく「近い順 k 個の LUT 候補のうち、誤差 max_error_mm 以内で
+    radcheck を通るものが 1 つでもある」を到達可能とするので、
+    ここで True になった点は IK でも必ず角度が付く。
+    """
+    cand_L, cand_R, _, valid = lookup_grid_lut(grid, points, max_error_mm=max_error_mm, k=k)
+    valid &= radcheck_batch(cand_L, cand_R, microsteps=microsteps)
+    return valid.any(axis=1)
+
+
 
 # =========================================
 #  🔵 新規追加: LUT から最も近い角度を検索する
@@ -224,15 +654,80 @@ def ik_from_lut(x, y, lut, max_dist=2.0):
 
 
 # =========================================
-#  🔵 新規追加: radcheck（今はダミー）
+#  1 ステップあたりの移動量（目安）
 # =========================================
-def radcheck(thL, thR):
+def mm_per_step(l1=65.0, microsteps=1):
+    """
+    第一リンク先端が 1 ステップで動く距離 [mm]。
+    平滑化や間引きの許容誤差を機械の分解能に合わせるときの目安に使う。
+    """
+    return l1 * np.radians(STEP_DEG / microsteps)
+
+
+# =========================================
+#  ヤコビアン（角度 → ペン先の局所的な動き）
+# =========================================
+def pen_tip_jacobian_batch(theta_l_deg, theta_r_deg, h=1e-3,
+                           l1=65, l2=85, d=50, offset=25):
+    """
+    forward_full_arm_batch の中心差分で、ペン先のヤコビアンをまとめて求める。
+
+    return:
+        J     : (..., 2, 2) [mm/deg]  J[..., :, 0] = ∂T/∂θL, J[..., :, 1] = ∂T/∂θR
+        valid : (...) bool（差分の 4 点すべてで順運動が成立）
     """
-    機構干渉などを後でここで実装する。
+    thL = np.asarray(theta_l_deg, dtype=float)
+    thR = np.asarray(theta_r_deg, dtype=float)
 
-    今は常に OK とする。
+    tL = np.stack([thL + h, thL - h, thL, thL])
+    tR = np.stack([thR, thR, thR + h, thR - h])
+    T, _, _, _, ok = forward_full_arm_batch(tL, tR, l1=l1, l2=l2, d=d, offset=offset)
+
+    J = np.stack([(T[0] - T[1]) / (2*h), (T[2] - T[3]) / (2*h)], axis=-1)
+    return J, ok.all(axis=0)
+
+
+# =========================================
+#  radcheck（関節空間の安全マップを引く）
+# =========================================
+def get_safety_mask(microsteps=1):
+    """
+    (step_L, step_R) の全組み合わせについて arm_safety_mask を評価した bool のビットマップ。
+    mask[i, j] : θL = -180 + i*step, θR = -180 + j*step が安全か
+    LUT キャッシュ（lutcache）と同じディレクトリの safety_mask.npy を mmap で開くので、
+    プロセスごとに作り直さず、1/16 ステップでも全体をメモリに載せない。
+    """
+    from .lutcache import load_lut_cached   # lutcache がこのモジュールを import するので中で読む
+    return load_lut_cached(microsteps=microsteps)["safety_mask"]
+
+
+def radcheck_batch(thL, thR, microsteps=1):
+    """
+    角度配列をまとめて安全マップで判定する（最寄りのステップ位置で引く）。
+    範囲外・NaN は False。
+    """
+    mask = get_safety_mask(microsteps)
+    step = STEP_DEG / microsteps
+
+    thL = np.asarray(thL, dtype=float)
+    thR = np.asarray(thR, dtype=float)
+
+    with np.errstate(invalid="ignore"):
+        iL = np.round((thL + 180) / step)
+        iR = np.round((thR + 180) / step)
+        inside = (iL >= 0) & (iL < mask.shape[0]) & (iR >= 0) & (iR < mask.shape[1])
+
+    iL = np.where(inside, iL, 0).astype(int)
+    iR = np.where(inside, iR, 0).astype(int)
+    return inside & mask[iL, iR]
+
+
+def radcheck(thL, thR, microsteps=1):
+    """
+    機構干渉チェック（1 点版）。
+    rad2csv の安全条件とリンク干渉を安全マップから引くだけなので軽い。
     """
-    return True
+    return bool(radcheck_batch(thL, thR, microsteps=microsteps))
 
 
 
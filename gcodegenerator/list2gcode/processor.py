@@ -3,9 +3,13 @@ import numpy as np
 
 from .list2goodlist import (
     simplify_curve,
+    simplify_curve_list,
     reorder_curve,
     visualize_curves,
     reorder_curves_by_tsp,
+    reorder_curves_by_joint_tsp,
+    merge_curve_list,
+    rdp_significance,
     save_curve_list_to_csv,
     rotate_curve_list,
     scale_curve_list,
@@ -17,19 +21,19 @@ from .list2goodlist import (
 def process_curve_list(curve_list):
     """
     main.py から呼ばれる
-    1) approxPolyDP による簡略化
+    1) RDP 重要度による簡略化（全曲線まとめて）
     2) RDP 特性を活かした並べ替え
     3) matplotlib による可視化
     """
 
     processed = []
 
-    for curve in curve_list:
-        # 1. approxPolyDP（50 点程度）
-        simplified = simplify_curve(curve["points"], target_points=250)
+    # 1. RDP 重要度で 250 点に
+    simplified_list = simplify_curve_list(curve_list, target_points=250)
 
+    for curve in simplified_list:
         # 2. 並べ替え
-        ordered = reorder_curve(simplified)
+        ordered = reorder_curve(curve["points"])
 
         processed.append({
             "curve_id": curve["curve_id"],
@@ -42,6 +46,41 @@ def process_curve_list(curve_list):
     return processed
 
 
+def merge_curves(curve_list, tol=3.0):
+    """
+    端点どうしが tol 以内の曲線をつないで、ペン上げ回数を減らす。
+    （旧 camera 経路の vpype linemerge の代わり）
+    """
+    merged, saved = merge_curve_list(curve_list, tol=tol)
+    print(f"曲線マージ: {len(curve_list)} → {len(merged)} 本（ペン上げ {saved} 回減）")
+    return merged
+
+
+def vectorize_curves(curve_list, merge_tol=3.0, simplify_tol=0.5):
+    """
+    抽出した曲線（画像の px）を描く前の形に整える。
+    旧 camera 経路の potrace → vpype（linemerge / simplify）の代わりで、
+    一時ファイルも子プロセスも使わない。
+
+    1. 結合   : 端点どうしが merge_tol 以内の曲線をつなぐ（linemerge）
+    2. 簡略化 : RDP で重要度 simplify_tol [px] 未満の点を落とす（simplify、0 で無し）
+
+    並べ替え（linesort）は sort_curves_tsp、平滑化は generate_rotandscale_curves の Chaikin で行う。
+    return: CurveSet
+    """
+    curves = merge_curves(CurveSet.from_curve_list(curve_list), tol=merge_tol)
+    if simplify_tol <= 0:
+        return curves
+
+    # 全曲線まとめて 1 回（各曲線の両端は残る）
+    keep = rdp_significance(curves.points, breaks=curves.offsets[:-1]) >= simplify_tol
+
+    # 残した点の累積数を各曲線の先頭で取れば新しい offsets（空の曲線・空の CurveSet もそのまま）
+    offsets = np.concatenate([[0], np.cumsum(keep)])[curves.offsets]
+    print(f"簡略化: {len(keep)} → {offsets[-1]} 点")
+    return CurveSet(curves.points[keep], offsets, curves.curve_ids)
+
+
 def sort_curves_tsp(curve_list):
     """
     TSP を使って曲線全体の描画順を決める。
@@ -51,6 +90,16 @@ def sort_curves_tsp(curve_list):
     return sorted_list
 
 
+def sort_result_joint_tsp(result, microsteps=1, max_rounds=50, time_limit=None):
+    """
+    IK 後（genrad_* の返り値）の曲線順を、モーターの実移動時間
+    （関節ステップのチェビシェフ距離）で決め直す。
+    xy で近くても、可動域の端では関節空間で遠いことがあるため。
+    """
+    return reorder_curves_by_joint_tsp(result, step_deg=STEP_DEG / microsteps,
+                                       max_rounds=max_rounds, time_limit=time_limit)
+
+
 def export_curve_csv(curve_list, filename="curves.csv"):
     save_curve_list_to_csv(curve_list, filename)
 
@@ -61,7 +110,12 @@ from list2gcode.list2goodlist import (
     translate_curve_list,
     round_curve_list,
     chaikin,
+    chaikin_curveset,
+    chaikin_adaptive,
+    build_affine_matrix,
+    apply_affine,
 )
+from list2gcode.curveset import CurveSet
 
 
 def generate_rotandscale_curves(curve_list,
@@ -70,40 +124,43 @@ def generate_rotandscale_curves(curve_list,
                                 box_h=148,
                                 offset_x=0,
                                 offset_y=0,
-                                decimal_digits=3):
+                                decimal_digits=3,
+                                chaikin_tol_mm=None):
     """
     並べ替え済みの curve_list に対して
     回転 → 縮小 → 平行移動 → 小数点丸め
-    """
+    CurveSet を渡すと CurveSet のまま返す（辞書リストなら辞書リスト）
 
-    # ① 回転
-    rotated = rotate_curve_list(curve_list, rotate_deg)
+    chaikin_tol_mm=None : 全線分に Chaikin（従来どおり、点数は約 4 倍）
+    chaikin_tol_mm=数値 : 角を切ったときのずれがこの値 [mm] を超える所だけ切る
+                          （mm_per_step() / 2 くらいにすると見た目はほぼ同じで点が増えない）
 
-    # ② 縮小（ハガキ等）
-    scaled = scale_curve_list(rotated, box_w, box_h)
-
-    #cheikin平滑化
-    smoothed = []
-    for curve in scaled:
-        if isinstance(curve, dict):
-            cid = curve["curve_id"]
-            pts = curve["points"]
-            new_pts = chaikin(pts, step=2)
-            smoothed.append({"curve_id": cid, "points": new_pts})
-        else:
-            smoothed.append(chaikin(curve, step=2))
+    回転・縮小・モーター座標反転・平行移動は 1 つの 3×3 行列にまとめ、
+    全点に 1 回だけかける。Chaikin 平滑化はアフィン変換と順番を入れ替えても
+    結果が同じなので、行列をかける前（元の座標）で行う。
+    """
+    curves = CurveSet.from_curve_list(curve_list)
 
+    # ①〜③ 回転 → 縮小 → モーター座標 → 平行移動 を 1 つの行列に
+    M = build_affine_matrix(curves, rotate_deg, box_w, box_h,
+                            height=100, offset_x=offset_x, offset_y=offset_y)
 
-    # モーター座標に変換
-    motor_ready = convert_to_motor_coords(smoothed, height=100)
+    #cheikin平滑化（全曲線まとめて。許容誤差は元の座標の単位に直す）
+    if chaikin_tol_mm is None:
+        smoothed = chaikin_curveset(curves, step=2)
+    else:
+        scale = np.sqrt(abs(np.linalg.det(M[:2, :2])))
+        smoothed = chaikin_adaptive(curves, step=2, tol=chaikin_tol_mm / scale)
 
-    # ③ 平行移動（offset_x, offset_y mm）
-    translated = translate_curve_list(motor_ready, offset_x, offset_y)
+    # 行列を全点に一括適用
+    transformed = apply_affine(smoothed, M, offset_y=offset_y)
 
     # ④ 小数点以下 N 桁で丸め
-    final_list = round_curve_list(translated, ndigits=decimal_digits)
+    final_list = round_curve_list(transformed, ndigits=decimal_digits)
 
-    return final_list
+    if isinstance(curve_list, CurveSet):
+        return final_list
+    return final_list.to_curve_list()
 
 
 
@@ -122,14 +179,173 @@ def generate_rotandscale_curves(curve_list,
 # ================================
 #   processor.py（新しい関数追加）
 # ================================
-from .makegcode import load_kdtree, radcheck
+from .makegcode import (
+    STEP_DEG,
+    mm_per_step,
+    load_kdtree,
+    radcheck,
+    radcheck_batch,
+    ik_pen_tip_batch,
+    load_grid_lut,
+    lookup_grid_lut,
+    classify_reachable,
+    pen_tip_jacobian_batch,
+)
+from .lutcache import load_lut_cached, kdtree_from_lut
+
+
+def split_reachable_curves(final_curves, max_error_mm=2.0, lut=None, microsteps=1):
+    """
+    IK の前に、届かない点を取り除いて曲線を「届く区間」ごとに分割する。
+    分割した所はペンが上がるので、紙の上を引きずらない。
+    curve_id は分割後の順に 1 から振り直す。
+    判定は genrad_kdtree と同じ基準（classify_reachable）なので、残った点は必ず IK が通る。
+    全曲線の点をまとめて 1 回で判定する。CurveSet を渡すと CurveSet で返す。
+    """
+    if lut is None:
+        lut = load_lut_cached(max_error_mm=max_error_mm, microsteps=microsteps)
+
+    curves = CurveSet.from_curve_list(final_curves)
+    ok = classify_reachable(lut, curves.points, max_error_mm=max_error_mm,
+                            microsteps=microsteps)
+
+    # 残った点のうち、前の残った点と曲線が違うか、間に捨てた点がある所で区間を切る
+    owner = curves.point_curve_index()
+    pos = np.flatnonzero(ok)
+    new_run = np.ones(len(pos), dtype=bool)
+    new_run[1:] = (owner[pos[1:]] != owner[pos[:-1]]) | (np.diff(pos) > 1)
+    starts = np.flatnonzero(new_run)
+
+    output = CurveSet(curves.points[pos],
+                      np.append(starts, len(pos)),
+                      np.arange(1, len(starts) + 1))
+
+    dropped = int((~ok).sum())
+    split = len(starts) - len(np.unique(owner[pos]))
+    if dropped:
+        print(f"⚠ 到達不能な点 {dropped} 個を除外（曲線の分割 {split} 箇所）")
+
+    if isinstance(final_curves, CurveSet):
+        return output
+    return output.to_curve_list()
+
+def resample_by_joint_step(final_curves, microsteps=1, grid=None,
+                           max_error_mm=2.0, decimal_digits=3, mode="greedy"):
+    """
+    IK の前に、各曲線の点を「関節空間でほぼ 1 ステップ間隔」に打ち直す。
+    convert_result_to_steps で同じステップに丸められて捨てられる点を先に減らし、
+    1 ステップより大きく動く区間には点を足す。
+
+    ・各点の角度は genrad_kdtree と同じ候補・同じ選び方（mode）で決め、
+      その姿勢でのヤコビアン J から区間ごとの角度変化 dθ ≈ J⁻¹ · dxy を求める
+      （両端の J⁻¹ の平均）。xy で一番近い LUT 行は別の IK 解（肘の向き）の
+      ことがあるので、実際に描く姿勢で評価する
+    ・区間の長さ = max(|dθL|, |dθR|) / step（ファームは大きい方のステップ数だけ動く）
+    ・累積ステップ数が整数になる所で xy を線形補間する（始点・終点は残す）
+    ・角度が引けない点や特異姿勢の区間は、mm_per_step で換算した長さを使う
+    LUT 引きとヤコビアンは全曲線の点をまとめて 1 回で行う。CurveSet を渡すと CurveSet で返す。
+    mode は後で呼ぶ genrad_kdtree と同じものを渡す。
+    """
+    select = _get_selector(mode)
+    step_deg = STEP_DEG / microsteps
+    fallback_mm = mm_per_step(microsteps=microsteps)
+
+    if grid is None:
+        grid = load_lut_cached(max_error_mm=max_error_mm, microsteps=microsteps)
+
+    curves = CurveSet.from_curve_list(final_curves)
+    pts_all = curves.points
+
+    cand_L, cand_R, _, valid = lookup_grid_lut(grid, pts_all, max_error_mm=max_error_mm)
+    valid &= radcheck_batch(cand_L, cand_R, microsteps=microsteps)
+
+    # 曲線ごとに genrad と同じ選び方で IK 解を決める
+    choice = np.full(len(pts_all), -1)
+    for i in range(len(curves)):
+        a, b = curves.offsets[i], curves.offsets[i + 1]
+        choice[a:b] = select(cand_L[a:b], cand_R[a:b], valid[a:b])
+
+    rows = np.arange(len(pts_all))
+    chosen = np.maximum(choice, 0)
+    J, ok_all = pen_tip_jacobian_batch(cand_L[rows, chosen], cand_R[rows, chosen])
+    ok_all &= choice >= 0
+
+    det = J[:, 0, 0] * J[:, 1, 1] - J[:, 0, 1] * J[:, 1, 0]
+    ok_all &= np.abs(det) > 1e-9
+    J[~ok_all] = np.eye(2)
+    Jinv_all = np.linalg.inv(J)
+
+    arrays = []
+
+    for i in range(len(curves)):
+        a, b = curves.offsets[i], curves.offsets[i + 1]
+        pts = pts_all[a:b]
+
+        if len(pts) < 2:
+            arrays.append(pts)
+            continue
+
+        ok = ok_all[a:b]
+        Jinv = Jinv_all[a:b]
+
+        seg = np.diff(pts, axis=0)
+        dth = np.einsum("nij,nj->ni", 0.5 * (Jinv[:-1] + Jinv[1:]), seg)
+        steps = np.abs(dth).max(axis=1) / step_deg
+
+        both = ok[:-1] & ok[1:]
+        steps = np.where(both, steps, np.hypot(seg[:, 0], seg[:, 1]) / fallback_mm)
+
+        s = np.concatenate([[0.0], np.cumsum(steps)])
+        total = s[-1]
+
+        if total <= 1.0:
+            new = pts[[0, -1]]
+        else:
+            n = int(np.ceil(total))
+            s_new = np.linspace(0.0, total, n + 1)
+            new = np.column_stack([np.interp(s_new, s, pts[:, 0]),
+                                   np.interp(s_new, s, pts[:, 1])])
+
+        arrays.append(np.round(new, decimal_digits))
+
+    output = CurveSet.from_arrays(arrays, curves.curve_ids)
+    print(f"関節ステップ間隔で再サンプリング: {len(pts_all)} → {len(output.points)} 点")
+
+    if isinstance(final_curves, CurveSet):
+        return output
+    return output.to_curve_list()
+
 
 def genrad_kdtree(final_curves,
-                  lut_path="lut_tree.pkl",
-                  max_error_mm=2.0):
+                  lut_path=None,
+                  max_error_mm=2.0,
+                  mode="greedy",
+                  lut=None,
+                  microsteps=1):
+    """
+    lut_path=None  : lutcache のキャッシュ（リンク寸法ごとに自動生成）を使う
+    lut_path=*.pkl : 従来の pickle 済み KD-tree を使う
+    lut            : load_lut_cached(l1=..., angle_step=...) の戻り値を直接渡す
+                     （リンク寸法や角度刻みを既定値から変えるとき）
+    microsteps     : LUT の角度刻みと radcheck の安全マップをこの分割数に合わせる
+                     （convert_result_to_steps と同じ値を渡す）
+
+    mode="greedy"  : 1 点ずつ、直前の角度に最も近い候補を選ぶ（従来どおり）
+    mode="viterbi" : 曲線の全点の候補を 1 回の tree.query で取り、
+                     角度変化の合計が最小になる並びを動的計画法で選ぶ
+
+    final_curves は辞書リストでも CurveSet でもよい。
+    返り値は角度付き (x, y, θL, θR) の辞書リスト（IK 失敗点は None が入るため）。
+    """
+    select = _get_selector(mode)
 
-    print("KD-tree をロード中:", lut_path)
-    tree, thL_list, thR_list = load_kdtree(lut_path)
+    if lut is not None:
+        tree, thL_list, thR_list = kdtree_from_lut(lut)
+    elif lut_path is None:
+        tree, thL_list, thR_list = kdtree_from_lut(load_lut_cached(microsteps=microsteps))
+    else:
+        print("KD-tree をロード中:", lut_path)
+        tree, thL_list, thR_list = load_kdtree(lut_path)
 
     output = []
 
@@ -137,6 +353,15 @@ def genrad_kdtree(final_curves,
         cid = curve["curve_id"]
         pts = curve["points"]
 
+        if select is not _select_greedy:
+            output.append({
+                "curve_id": cid,
+                "points": _genrad_kdtree_batch(pts, tree, thL_list, thR_list,
+                                               max_error_mm, select,
+                                               microsteps=microsteps)
+            })
+            continue
+
         new_pts = []
         prev_L = None
         prev_R = None
@@ -156,7 +381,7 @@ def genrad_kdtree(final_curves,
                 thL = thL_list[idx]
                 thR = thR_list[idx]
 
-                if not radcheck(thL, thR):
+                if not radcheck(thL, thR, microsteps=microsteps):
                     continue
 
                 # 角度連続性評価
@@ -185,22 +410,217 @@ def genrad_kdtree(final_curves,
 
 
 
+def _genrad_kdtree_batch(pts, tree, thL_list, thR_list, max_error_mm, select, k=20,
+                         microsteps=1):
+    """
+    genrad_kdtree の一括版（1 曲線分）。
+    全点の k 近傍を 1 回の tree.query で取り、select で候補を選ぶ。
+    """
+    xy = np.asarray(pts, dtype=float).reshape(-1, 2)
+    if len(xy) == 0:
+        return []
+
+    dists, idxs = tree.query(xy, k=k)
+    dists = dists.reshape(len(xy), k)
+    idxs = idxs.reshape(len(xy), k)
+
+    # 候補が k 個に満たない場合は idx = len(data) が返る
+    has = idxs < len(thL_list)
+    safe_idx = np.where(has, idxs, 0)
+
+    cand_L = np.asarray(thL_list)[safe_idx]
+    cand_R = np.asarray(thR_list)[safe_idx]
+
+    valid = has & (dists <= max_error_mm) & radcheck_batch(cand_L, cand_R, microsteps=microsteps)
+
+    choice = select(cand_L, cand_R, valid)
+
+    new_pts = []
+    for n, ((x, y), kk) in enumerate(zip(xy.tolist(), choice)):
+        if kk < 0:
+            new_pts.append((x, y, None, None))
+        else:
+            new_pts.append((x, y, cand_L[n, kk], cand_R[n, kk]))
+    return new_pts
+
+
+def _select_viterbi(cand_L, cand_R, valid):
+    """
+    候補 (N, K) から、隣り合う点の角度変化（|ΔθL| + |ΔθR|）の合計が
+    最小になる並びを動的計画法（Viterbi）で選ぶ。
+    有効候補のない点は飛ばし、前後の有効点どうしをつなぐ。
+
+    return: (N,) の候補番号（有効候補なし → -1）
+    """
+    N = len(cand_L)
+    choice = np.full(N, -1, dtype=int)
+
+    rows = np.flatnonzero(valid.any(axis=1))
+    if len(rows) == 0:
+        return choice
+
+    L = cand_L[rows]
+    R = cand_R[rows]
+    ok = valid[rows]
+
+    cost = np.where(ok[0], 0.0, np.inf)
+    back = np.zeros(L.shape, dtype=int)
+
+    for n in range(1, len(rows)):
+        # trans[i, j] = 前の候補 i → 今の候補 j の角度変化
+        trans = (np.abs(L[n - 1][:, None] - L[n][None, :])
+                 + np.abs(R[n - 1][:, None] - R[n][None, :]))
+        total = cost[:, None] + trans
+        back[n] = np.argmin(total, axis=0)
+        cost = np.where(ok[n], total[back[n], np.arange(total.shape[1])], np.inf)
+
+    # 後ろからたどる
+    k = int(np.argmin(cost))
+    for n in range(len(rows) - 1, -1, -1):
+        choice[rows[n]] = k
+        k = back[n, k]
+
+    return choice
+
+
+def _get_selector(mode):
+    if mode == "greedy":
+        return _select_greedy
+    elif mode == "viterbi":
+        return _select_viterbi
+    raise ValueError(f"❌ 不明な mode 指定: {mode}")
+
+
+def _select_greedy(cand_L, cand_R, valid):
+    """
+    候補 (N, K) の中から、直前の角度に最も近いものを順に選ぶ。
+    genrad_kdtree と同じ評価（|ΔθL| + |ΔθR|）。
+
+    return: (N,) の候補番号（有効候補なし → -1）
+    """
+    N = len(cand_L)
+    choice = np.full(N, -1, dtype=int)
+    prev = None
+
+    for n in range(N):
+        ok = np.flatnonzero(valid[n])
+        if len(ok) == 0:
+            continue
+
+        if prev is None:
+            k = ok[0]
+        else:
+            score = np.abs(cand_L[n, ok] - prev[0]) + np.abs(cand_R[n, ok] - prev[1])
+            k = ok[np.argmin(score)]
+
+        choice[n] = k
+        prev = (cand_L[n, k], cand_R[n, k])
+
+    return choice
+
+
+def genrad_analytic(final_curves, l1=65.0, l2=85.0, d=50.0, offset=25.0,
+                    mode="greedy"):
+    """
+    genrad_kdtree の LUT 無し版。
+    ik_pen_tip_batch で 1 曲線分の全点を一括で解き、
+    4 ブランチの中から角度連続性で 1 つを選ぶ（mode は genrad_kdtree と同じ）。
+    出力形式は genrad_kdtree と同じ。
+    """
+    select = _get_selector(mode)
+
+    output = []
+
+    for curve in final_curves:
+        cid = curve["curve_id"]
+        pts = np.asarray(curve["points"], dtype=float).reshape(-1, 2)
+
+        thetas, valid = ik_pen_tip_batch(pts, l1=l1, l2=l2, d=d, offset=offset)
+        choice = select(thetas[..., 0], thetas[..., 1], valid)
+
+        new_pts = []
+        for (x, y), k, th in zip(pts.tolist(), choice, thetas):
+            if k < 0:
+                new_pts.append((x, y, None, None))
+            else:
+                new_pts.append((x, y, float(th[k, 0]), float(th[k, 1])))
+
+        output.append({
+            "curve_id": cid,
+            "points": new_pts
+        })
+
+    return output
+
+
+
+def genrad_grid(final_curves,
+                grid_path=None,
+                max_error_mm=2.0,
+                refine=False,
+                mode="greedy",
+                microsteps=1):
+    """
+    genrad_kdtree の格子 LUT 版。
+    1 曲線分の点をまとめて整数インデックスで引くので、点ごとの木探索がない。
+    refine=True なら LUT 角度を局所線形補正して LUT 分解能以下の精度にする。
+    grid_path=None なら lutcache のキャッシュを使う。
+    mode, microsteps は genrad_kdtree と同じ。出力形式も genrad_kdtree と同じ。
+    """
+    select = _get_selector(mode)
+
+    if grid_path is None:
+        grid = load_lut_cached(max_error_mm=max_error_mm, microsteps=microsteps)
+    else:
+        print("格子 LUT をロード中:", grid_path)
+        grid = load_grid_lut(grid_path)
+
+    output = []
+
+    for curve in final_curves:
+        cid = curve["curve_id"]
+        pts = np.asarray(curve["points"], dtype=float).reshape(-1, 2)
+
+        cand_L, cand_R, _, valid = lookup_grid_lut(
+            grid, pts, max_error_mm=max_error_mm, refine=refine
+        )
+        valid &= radcheck_batch(cand_L, cand_R, microsteps=microsteps)
+        choice = select(cand_L, cand_R, valid)
+
+        new_pts = []
+        for n, ((x, y), k) in enumerate(zip(pts.tolist(), choice)):
+            if k < 0:
+                new_pts.append((x, y, None, None))
+            else:
+                new_pts.append((x, y, float(cand_L[n, k]), float(cand_R[n, k])))
+
+        output.append({
+            "curve_id": cid,
+            "points": new_pts
+        })
+
+    return output
+
+
+
 
 # =========================================
 #  stepとして保存
 # =========================================
 import csv
 
-STEP_DEG = 1.8  # 1ステップ = 1.8度
+from .makegcode import STEP_DEG  # 1ステップ = 1.8度
 
-def convert_result_to_steps(result, out_csv="abs_steps.csv"):
+def convert_result_to_steps(result, out_csv="abs_steps.csv", microsteps=1):
     """
     result（genrad_kdtree の返り値）から角度を取り出し、
     絶対ステップへ変換し、前と同じ角度は削除して CSV に保存する。
+    microsteps=2〜16 ならマイクロステップ単位（STEP_DEG / microsteps）で出力する。
 
     CSV形式: curve_id, abs_step_L, abs_step_R
     return: [(cid, abs_L, abs_R), ...]
     """
+    step_deg = STEP_DEG / microsteps
 
     rows = []
     out_list = []
@@ -226,8 +646,8 @@ def convert_result_to_steps(result, out_csv="abs_steps.csv"):
                     continue
 
                 # 絶対ステップへ変換
-                abs_L = round(thL / STEP_DEG)
-                abs_R = round(thR / STEP_DEG)
+                abs_L = round(thL / step_deg)
+                abs_R = round(thR / step_deg)
 
                 # 🚫 前回と同じステップならスキップ
                 if prev_L is not None and abs_L == prev_L and abs_R == prev_R:
@@ -0,0 +1,370 @@
+"""
+SVG → 曲線（ストリーミング）
+
+simulate/work/makegcode/svg2list.parse_svg の中身（もとは svg.path + minidom）。
+・ファイルは iterparse で 1 回だけ先頭から読み、処理し終わった要素はすぐ捨てる
+・path の d 属性は自前で解析し、直線 / 3 次・2 次ベジエ / 円弧を
+  種類ごとに numpy でまとめて評価する（1 点ずつ seg.point() を呼ばない）
+・点数は区間の弧長 / max_step（svg.path で分割していたときと同じ基準）
+・曲線はでき次第 yield するので、大きな vpype 出力でもメモリが増えない
+
+transform 属性は（もとの parse_svg と同じく）見ない。
+"""
+import re
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+from .curveset import CurveSet
+
+# 弧長の見積もりに使う分割数（ベジエ・円弧）。
+# 折れ線の長さを n 分割と n/2 分割で求め、Richardson 外挿で誤差 O(h^4) にする
+# （svg.path の弧長とほぼ一致し、弧長 / max_step の切り捨てで点数がずれない）
+_LENGTH_SAMPLES = 32
+
+_NUMBER = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+_FLAG = re.compile(r"[01]")
+_SEP = re.compile(r"[\s,]*")
+_COMMAND = re.compile(r"[MmLlHhVvCcSsQqTtAaZz]")
+
+# コマンドごとの引数の数
+_N_ARGS = {"M": 2, "L": 2, "H": 1, "V": 1, "C": 6, "S": 4, "Q": 4, "T": 2, "A": 7, "Z": 0}
+
+
+# =========================================================
+# d 属性の解析
+# =========================================================
+def _tokenize_path(d):
+    """
+    d 属性を (コマンド, 引数リスト) の列にする。
+    同じコマンドの繰り返し（M の後の座標は L 扱い）もここで展開する。
+    円弧のフラグは "0 01" のように詰めて書かれることがあるので 1 文字ずつ読む。
+    """
+    pos = _SEP.match(d, 0).end()
+    cmd = None
+
+    while pos < len(d):
+        m = _COMMAND.match(d, pos)
+        if m:
+            cmd = m.group()
+            pos = _SEP.match(d, m.end()).end()
+            if cmd in "Zz":
+                yield cmd, []
+                continue
+        elif cmd is None or cmd in "Zz":
+            raise ValueError(f"❌ path の解析に失敗: {d[pos:pos + 20]!r}")
+
+        n = _N_ARGS[cmd.upper()]
+        args = []
+        for i in range(n):
+            pat = _FLAG if cmd in "Aa" and i in (3, 4) else _NUMBER
+            m = pat.match(d, pos)
+            if m is None:
+                raise ValueError(f"❌ path の数値が足りません: {d[pos:pos + 20]!r}")
+            args.append(float(m.group()))
+            pos = _SEP.match(d, m.end()).end()
+        yield cmd, args
+
+        # M の後に続く座標は L（m なら l）
+        if cmd == "M":
+            cmd = "L"
+        elif cmd == "m":
+            cmd = "l"
+
+
+def _path_segments(d):
+    """
+    d 属性を絶対座標の区間リストに分解する。
+    return: [(kind, ctrl, subpath), ...]
+        kind    : "L"（直線） / "C"（3 次ベジエ） / "Q"（2 次ベジエ） / "A"（円弧）
+        ctrl    : L → (p0, p1), C → (p0, p1, p2, p3), Q → (p0, p1, p2),
+                  A → (p0, p1, rx, ry, phi_deg, large_arc, sweep)
+        subpath : サブパス番号（M ごとに増える）
+    """
+    segs = []
+    cur = np.zeros(2)
+    start = np.zeros(2)
+    prev_ctrl = None      # S / T 用の直前の制御点
+    prev_kind = None
+    sub = -1
+
+    for cmd, a in _tokenize_path(d):
+        rel = cmd.islower()
+        C = cmd.upper()
+        base = cur if rel else np.zeros(2)
+
+        if C == "M":
+            cur = base + a[:2]
+            start = cur.copy()
+            sub += 1
+            prev_kind = None
+            continue
+
+        if sub < 0:
+            # M なしで始まる path（規格外）も 1 本目のサブパスとして扱う
+            sub = 0
+
+        if C == "Z":
+            if not np.array_equal(cur, start):
+                segs.append(("L", (cur, start), sub))
+            cur = start.copy()
+            prev_kind = None
+            continue
+
+        if C in "LHV":
+            if C == "L":
+                nxt = base + a[:2]
+            elif C == "H":
+                nxt = np.array([a[0] + (cur[0] if rel else 0), cur[1]])
+            else:
+                nxt = np.array([cur[0], a[0] + (cur[1] if rel else 0)])
+            segs.append(("L", (cur, nxt), sub))
+            cur = nxt
+            prev_kind = "L"
+
+        elif C in "CS":
+            if C == "C":
+                c1 = base + a[0:2]
+                c2, p = base + a[2:4], base + a[4:6]
+            else:
+                c1 = 2 * cur - prev_ctrl if prev_kind == "C" else cur.copy()
+                c2, p = base + a[0:2], base + a[2:4]
+            segs.append(("C", (cur, c1, c2, p), sub))
+            prev_ctrl, prev_kind = c2, "C"
+            cur = p
+
+        elif C in "QT":
+            if C == "Q":
+                c1, p = base + a[0:2], base + a[2:4]
+            else:
+                c1 = 2 * cur - prev_ctrl if prev_kind == "Q" else cur.copy()
+                p = base + a[0:2]
+            segs.append(("Q", (cur, c1, p), sub))
+            prev_ctrl, prev_kind = c1, "Q"
+            cur = p
+
+        else:  # A
+            p = base + a[5:7]
+            rx, ry = abs(a[0]), abs(a[1])
+            if np.array_equal(cur, p):
+                pass  # 規格どおり、始点と終点が同じ円弧は省く
+            elif rx == 0 or ry == 0:
+                segs.append(("L", (cur, p), sub))
+            else:
+                segs.append(("A", (cur, p, rx, ry, a[2], a[3], a[4]), sub))
+            cur = p
+            prev_kind = "A"
+
+    return segs
+
+
+# =========================================================
+# 区間の一括評価
+# =========================================================
+def _eval_bezier(ctrl, seg, t):
+    """
+    ctrl : (n, k, 2) 制御点（k = 2:直線, 3:2 次, 4:3 次）
+    seg  : (m,) 各点が属する区間番号,  t : (m,) パラメータ
+    return: (m, 2)
+    """
+    k = ctrl.shape[1]
+    c = ctrl[seg]
+    t = t[:, None]
+    s = 1 - t
+    if k == 2:
+        return s * c[:, 0] + t * c[:, 1]
+    if k == 3:
+        return s * s * c[:, 0] + 2 * s * t * c[:, 1] + t * t * c[:, 2]
+    return (s**3 * c[:, 0] + 3 * s * s * t * c[:, 1]
+            + 3 * s * t * t * c[:, 2] + t**3 * c[:, 3])
+
+
+def _arc_centers(p0, p1, rx, ry, phi_deg, fa, fs):
+    """
+    端点表現の円弧を中心表現に変換する（SVG 規格 F.6.5 / F.6.6、配列でまとめて）。
+    return: (center (n, 2), rx, ry, cos_phi, sin_phi, theta1, dtheta)
+    """
+    phi = np.radians(phi_deg)
+    cp, sp = np.cos(phi), np.sin(phi)
+
+    h = (p0 - p1) / 2
+    x1 = cp * h[:, 0] + sp * h[:, 1]
+    y1 = -sp * h[:, 0] + cp * h[:, 1]
+
+    # 半径が足りなければ拡大
+    lam = (x1 / rx) ** 2 + (y1 / ry) ** 2
+    scale = np.sqrt(np.maximum(lam, 1.0))
+    rx = rx * scale
+    ry = ry * scale
+
+    num = rx**2 * ry**2 - rx**2 * y1**2 - ry**2 * x1**2
+    den = rx**2 * y1**2 + ry**2 * x1**2
+    coef = np.sqrt(np.maximum(num, 0) / den)
+    coef = np.where(fa == fs, -coef, coef)
+
+    cx1 = coef * rx * y1 / ry
+    cy1 = -coef * ry * x1 / rx
+
+    mid = (p0 + p1) / 2
+    center = np.column_stack([cp * cx1 - sp * cy1, sp * cx1 + cp * cy1]) + mid
+
+    ux, uy = (x1 - cx1) / rx, (y1 - cy1) / ry
+    vx, vy = (-x1 - cx1) / rx, (-y1 - cy1) / ry
+    theta1 = np.arctan2(uy, ux)
+    dtheta = np.arctan2(ux * vy - uy * vx, ux * vx + uy * vy)
+    dtheta = np.where((fs == 0) & (dtheta > 0), dtheta - 2 * np.pi, dtheta)
+    dtheta = np.where((fs == 1) & (dtheta < 0), dtheta + 2 * np.pi, dtheta)
+
+    return center, rx, ry, cp, sp, theta1, dtheta
+
+
+def _eval_arc(params, seg, t):
+    """params = _arc_centers の戻り値, seg / t : (m,) → (m, 2)"""
+    center, rx, ry, cp, sp, theta1, dtheta = (np.asarray(v)[seg] for v in params)
+    th = theta1 + dtheta * t
+    ex = rx * np.cos(th)
+    ey = ry * np.sin(th)
+    return np.column_stack([cp * ex - sp * ey + center[:, 0],
+                            sp * ex + cp * ey + center[:, 1]])
+
+
+def _ragged_t(counts):
+    """
+    区間 i を counts[i] 等分した t = 1/n, 2/n, ..., 1 をまとめて作る（t=0 は前の区間の終点）。
+    return: (seg_index, col, t)  col = 区間内の番号 0..counts[i]-1
+    """
+    seg = np.repeat(np.arange(len(counts)), counts)
+    first = np.cumsum(counts) - counts
+    col = np.arange(len(seg)) - first[seg]
+    return seg, col, (col + 1) / counts[seg]
+
+
+def sample_path(d, max_step=3.0):
+    """
+    path の d 属性を点列にする（M ごとに別の曲線）。
+    各区間は弧長 / max_step 個（最低 2）に分け、種類ごとに一括で評価する。
+    return: [(N, 2) 配列, ...]
+    """
+    segs = _path_segments(d)
+    if not segs:
+        return []
+
+    n = len(segs)
+    kinds = np.array([k for k, _, _ in segs])
+    subs = np.array([s for _, _, s in segs])
+    p0 = np.array([c[0] for _, c, _ in segs], dtype=float)
+
+    # --- 種類ごとに弧長を見積もる ---
+    lengths = np.zeros(n)
+    evaluators = {}
+
+    for kind in ("L", "Q", "C", "A"):
+        idx = np.flatnonzero(kinds == kind)
+        if len(idx) == 0:
+            continue
+
+        if kind == "A":
+            arr = [segs[i][1] for i in idx]
+            params = _arc_centers(*(np.array([a[j] for a in arr], dtype=float) for j in range(7)))
+            fn = (lambda params: lambda seg, t: _eval_arc(params, seg, t))(params)
+        else:
+            ctrl = np.array([segs[i][1] for i in idx], dtype=float)
+            fn = (lambda ctrl: lambda seg, t: _eval_bezier(ctrl, seg, t))(ctrl)
+
+        if kind == "L":
+            d_ = ctrl[:, 1] - ctrl[:, 0]
+            lengths[idx] = np.hypot(d_[:, 0], d_[:, 1])
+        else:
+            k = _LENGTH_SAMPLES + 1
+            seg = np.repeat(np.arange(len(idx)), k)
+            t = np.tile(np.linspace(0, 1, k), len(idx))
+            probe = fn(seg, t).reshape(len(idx), k, 2)
+            fine = np.hypot(*np.diff(probe, axis=1).transpose(2, 0, 1)).sum(axis=1)
+            coarse = np.hypot(*np.diff(probe[:, ::2], axis=1).transpose(2, 0, 1)).sum(axis=1)
+            lengths[idx] = fine + (fine - coarse) / 3
+
+        evaluators[kind] = (idx, fn)
+
+    counts = np.maximum(2, (lengths / max_step).astype(int))
+
+    # --- 出力位置（サブパスの先頭には始点を 1 つ置く） ---
+    new_sub = np.concatenate([[True], subs[1:] != subs[:-1]])
+    slots = counts + new_sub
+    end = np.cumsum(slots)
+    begin = end - counts
+    out = np.empty((end[-1], 2))
+    out[begin[new_sub] - 1] = p0[new_sub]
+
+    # --- 種類ごとに全区間の点をまとめて評価して書き込む ---
+    for kind, (idx, fn) in evaluators.items():
+        seg, col, t = _ragged_t(counts[idx])
+        out[begin[idx][seg] + col] = fn(seg, t)
+
+    # --- サブパスごとに分ける ---
+    cut = (end - slots)[new_sub][1:]
+    return np.split(out, cut)
+
+
+# =========================================================
+# ストリーミング読み込み
+# =========================================================
+def _local(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def _points_attr(s):
+    nums = np.array(_NUMBER.findall(s), dtype=float)
+    return nums[: len(nums) // 2 * 2].reshape(-1, 2)
+
+
+def iter_svg_curves(svg_path, max_step=3.0, start_id=1):
+    """
+    SVG を先頭から 1 回だけ読みながら、曲線を 1 本ずつ返す。
+    対応: line / polyline / polygon / path（path は M ごとに別の曲線）
+
+    yield: {"curve_id": int, "type": 要素名, "points": (N, 2) float 配列}
+    """
+    cid = start_id
+    stack = []
+
+    for event, elem in ET.iterparse(str(svg_path), events=("start", "end")):
+        if event == "start":
+            stack.append(elem)
+            continue
+
+        stack.pop()
+        tag = _local(elem.tag)
+        curves = []
+
+        if tag == "line":
+            curves = [np.array([[float(elem.get("x1", 0)), float(elem.get("y1", 0))],
+                                [float(elem.get("x2", 0)), float(elem.get("y2", 0))]])]
+        elif tag in ("polyline", "polygon"):
+            pts = _points_attr(elem.get("points", ""))
+            if tag == "polygon" and len(pts):
+                pts = np.vstack([pts, pts[:1]])
+            curves = [pts]
+        elif tag == "path":
+            d = elem.get("d")
+            if d:
+                curves = sample_path(d, max_step=max_step)
+
+        for pts in curves:
+            if len(pts):
+                yield {"curve_id": cid, "type": tag, "points": pts}
+                cid += 1
+
+        # 読み終わった要素は親から外して、木が大きくならないようにする
+        elem.clear()
+        if stack:
+            stack[-1].remove(elem)
+
+
+def load_svg_curves(svg_path, max_step=3.0):
+    """iter_svg_curves をすべて読み、CurveSet にまとめる"""
+    arrays = []
+    ids = []
+    for curve in iter_svg_curves(svg_path, max_step=max_step):
+        arrays.append(curve["points"])
+        ids.append(curve["curve_id"])
+    return CurveSet.from_arrays(arrays, ids)
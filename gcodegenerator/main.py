@@ -1,17 +1,32 @@
 from camera.processor import capture_and_extract_curve_list
+from list2gcode.makegcode import mm_per_step
+from list2gcode.lutcache import load_lut_cached
 from list2gcode.processor import (
+    vectorize_curves,
     sort_curves_tsp,
     export_curve_csv,
     generate_rotandscale_curves,
     genrad_kdtree,
+    split_reachable_curves,
+    resample_by_joint_step,
+    sort_result_joint_tsp,
     convert_result_to_steps
 )
+# A4988 のマイクロステップ分割数（1, 2, 4, 8, 16）。
+# LUT の角度刻み・安全マップ・ステップ変換はすべてこの 1 つの値に合わせる
+MICROSTEPS = 1
+
+# 格子 LUT の 1 マスの候補数。"auto" は 1 ステップなら全部、1/2〜1/16 は上限付き
+# （None で常に全部、整数でその個数まで）
+GRID_K = "auto"
+
 """
 curve_list = capture_and_extract_curve_list(source="camera")
 """
 curve_list = capture_and_extract_curve_list(
     source="image",
-    image_path="/Users/kawashimasatoshishin/cutting_machine/gcodegenerator/qiita.png"
+    image_path="/Users/kawashimasatoshishin/cutting_machine/gcodegenerator/qiita.png",
+    mode="graph"          # 線の中心を分岐点でつないで一筆書き（"contour" は線の両側をなぞる）
 )
 
 if curve_list is None:
@@ -19,7 +34,11 @@ if curve_list is None:
 else:
     # --- 曲線内部順序済みの curve_list が来る前提 ---
 
-    sorted_list = sort_curves_tsp(curve_list)
+    # 端点の近い曲線をつなぎ（ペン上げを減らす）、画素の階段を RDP で落とす
+    # ここから genrad_kdtree までは全曲線を 1 本の配列（CurveSet）で持ち回す
+    merged_list = vectorize_curves(curve_list, merge_tol=3.0, simplify_tol=0.5)
+
+    sorted_list = sort_curves_tsp(merged_list)
 
     final_curves = generate_rotandscale_curves(
         sorted_list,
@@ -28,13 +47,24 @@ else:
         box_h = 100,          # ハガキ長辺
         offset_x = -148/2,        # →方向に 10mm 移動
         offset_y = 40,        # ↓方向に -5mm 移動
-        decimal_digits = 3    # 小数点以下3桁
-)
-    result = genrad_kdtree(
-    final_curves,
-    lut_path="/Users/kawashimasatoshishin/cutting_machine/gcodegenerator/list2gcode/lut_tree.pkl"
+        decimal_digits = 3,   # 小数点以下3桁
+        chaikin_tol_mm = mm_per_step(microsteps=MICROSTEPS) / 2   # 機械の分解能以下の角は切らない
 )
-    step_list = convert_result_to_steps(result, out_csv="steps_for_raspi.csv")
+    # LUT（逆引き格子・安全マップ）はリンク寸法ごとに list2gcode/lut_cache/ へ自動生成される
+    lut = load_lut_cached(microsteps=MICROSTEPS, k=GRID_K)
+
+    # 届かない点で曲線を分割（ペンを引きずらないように）
+    final_curves = split_reachable_curves(final_curves, lut=lut, microsteps=MICROSTEPS)
+
+    # 関節空間でほぼ 1 ステップ間隔に点を打ち直す（IK の点数を機械の分解能に合わせる）
+    final_curves = resample_by_joint_step(final_curves, microsteps=MICROSTEPS, grid=lut)
+
+    result = genrad_kdtree(final_curves, lut=lut, microsteps=MICROSTEPS)
+
+    # IK 後にモーターの移動ステップ数で曲線順を決め直す
+    result = sort_result_joint_tsp(result, microsteps=MICROSTEPS)
+    step_list = convert_result_to_steps(result, out_csv="steps_for_raspi.csv",
+                                        microsteps=MICROSTEPS)
 
 
     # CSV に保存
@@ -0,0 +1,31 @@
+import sys
+from pathlib import Path
+import numpy as np
+
+# gcodegenerator/list2gcode/makegcode.py の LUT 関数を使う
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT / "gcodegenerator"))
+
+from list2gcode.makegcode import build_grid_lut, save_grid_lut
+
+
+# angles_to_xy.csv から格子 LUT（.npz）を作る
+def generate_grid_lut_from_csv(csv_path="angles_to_xy.csv", out_npz="lut_grid.npz",
+                               cell_mm=1.0, k=None, max_error_mm=2.0):
+
+    table = np.loadtxt(csv_path, delimiter=",", skiprows=1)
+    theta_L, theta_R, xy = table[:, 0], table[:, 1], table[:, 2:4]
+
+    grid = build_grid_lut(theta_L, theta_R, xy,
+                          cell_mm=cell_mm, k=k, max_error_mm=max_error_mm)
+    save_grid_lut(grid, out_npz)
+
+    ny, nx = grid["shape"]
+    print(f"格子 LUT を保存しました → {out_npz}  ({nx}×{ny} マス, {cell_mm}mm)")
+
+
+# 実行
+generate_grid_lut_from_csv(
+    ROOT / "makerad2csvlist" / "angles_to_xy.csv",
+    ROOT / "gcodegenerator" / "list2gcode" / "lut_grid.npz",
+)
@@ -1,7 +1,15 @@
 import csv
+import sys
+from pathlib import Path
 import numpy as np
 import matplotlib.pyplot as plt
 
+# 安全な角度表は gcodegenerator/list2gcode/lutcache.py の build_angle_table で作る
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT / "gcodegenerator"))
+
+from list2gcode.lutcache import build_angle_table
+
 
 # ============================================================
 #  FK-1 : 第一リンク（l1）先端座標を求める
@@ -167,6 +175,7 @@ def plot_full_arm(theta_l_deg, theta_r_deg, l1=65, l2=85, d=50, offset=25, plot=
 
 
 
+
 print(plot_full_arm(40,60, l1=65, l2=85, d=50, offset=25, plot=True))
 
 # 角度リストの生成（-180 ～ 180 を 1.8° 刻み）
@@ -182,55 +191,13 @@ LEFT_MOTOR_X  = -D/2   # -25
 RIGHT_MOTOR_X = +D/2   # +25
 
 def generate_angle_csv(outpath="angles_to_xy.csv"):
-    rows = []
-    total = 0
-    ok = 0
-
-    for thL in ANGLES:
-        for thR in ANGLES:
-
-            total += 1
-
-            # 順運動
-            result = plot_full_arm(
-                thL, thR,
-                l1=65, l2=85, d=D, offset=25,
-                plot=False
-            )
-
-            if result is None:
-                continue
-
-            P_tip, P, L_tip, R_tip = result
-
-            Lx, Ly = L_tip
-            Rx, Ry = R_tip
-            Px, Py = P
-
-            # 第二関節の左右関係
-            if not (Lx + 1 < Px < Rx - 1):
-                continue
-
-            # 両方の第一関節が低い（危険領域）
-            if Ly < 20 and Ry < 20:
-                continue
-
-            # 左第一関節が右モーター側へ大きく侵入したらNG（余裕を持たせる）
-            if Lx > RIGHT_MOTOR_X + 10 and Ly < -10:
-                continue
-
-            # 右第一関節が左側へ大きく侵入したらNG
-            if Rx < LEFT_MOTOR_X - 10 and Ry < -10:
-                continue
-
-
-            # ------------------------------------------------------
-            # すべての安全チェックを通過した場合のみ採用
-            # ------------------------------------------------------
+    # 順運動と安全チェックは LUT キャッシュと同じもの（list2gcode.lutcache）を使う。
+    # 条件を 2 か所に書かないので、SAFETY_FILTER_VERSION とずれることがない
+    thL, thR, xy = build_angle_table(l1=65, l2=85, d=D, offset=25, angle_step=1.8)
+    rows = np.column_stack([thL, thR, xy])
 
-            x, y = P_tip
-            rows.append([thL, thR, x, y])
-            ok += 1
+    total = len(ANGLES) ** 2
+    ok = len(rows)
 
     print(f"総角度={total}  OK={ok}  (安全角度のみ採用)")
     print(f"CSV → {outpath}")
@@ -238,6 +205,6 @@ def generate_angle_csv(outpath="angles_to_xy.csv"):
     with open(outpath, "w", newline="", encoding="utf-8") as f:
         writer = csv.writer(f)
         writer.writerow(["theta_L", "theta_R", "x", "y"])
-        writer.writerows(rows)
+        writer.writerows(rows.tolist())
 
 generate_angle_csv(outpath="angles_to_xy.csv")
\ No newline at end of file
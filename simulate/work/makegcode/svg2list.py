@@ -1,14 +1,51 @@
 # svgを解析する(svg→numpy & debug txt)
 # ハガキサイズに正規化する。
 
-from svg.path import parse_path
-from xml.dom import minidom
 import cv2
 import matplotlib.pyplot as plt
 import xml.etree.ElementTree as ET
 import numpy as np
 from pathlib import Path
 import re
+import sys
+
+# リポジトリ全体があれば list2gcode（gcodegenerator 直下）のストリーミング版を使う。
+# docker の notebook は simulate/work だけをマウントするので、無ければ svg.path 版に戻す
+_GCODEGENERATOR = Path(__file__).resolve().parents[3] / "gcodegenerator"
+if _GCODEGENERATOR.is_dir():
+    sys.path.insert(0, str(_GCODEGENERATOR))
+try:
+    from list2gcode.svgsource import iter_svg_curves
+except ImportError:
+    from svg.path import parse_path
+    from xml.dom import minidom
+    iter_svg_curves = None
+
+
+def parse_svg(svg_path, max_step=3.0):
+    """
+    SVG → line/polyline/polygon/path を以下の形式で返す：
+    [
+        {"type": "path", "points": [(x,y),...]},
+        ...
+    ]
+    path は区間の弧長 / max_step(px) ごとに分割する。
+
+    list2gcode があれば読み込みと点列化は list2gcode.svgsource.iter_svg_curves に任せる
+    （1 回の iterparse で読み、path の区間は種類ごとにまとめて評価）。
+    このときは要素が文書の順に並び、path は M ごとに別の曲線になる。
+    無ければ _parse_svg_svgpath（line → polyline → path の順、path は 1 本のまま）。
+    """
+    if iter_svg_curves is None:
+        return _parse_svg_svgpath(svg_path, max_step=max_step)
+
+    return [
+        {"type": c["type"], "points": [tuple(p) for p in c["points"].tolist()]}
+        for c in iter_svg_curves(svg_path, max_step=max_step)
+    ]
+
+
+
 
 
 def sample_segment(seg, max_step=3.0):
@@ -24,13 +61,11 @@ def sample_segment(seg, max_step=3.0):
         pts.append((p.real, p.imag))
     return pts
 
-def parse_svg(svg_path):
+def _parse_svg_svgpath(svg_path, max_step=3.0):
     """
-    SVG → line/polyline/path を以下の形式で返す：
-    [
-        {"type": "path", "points": [(x,y),...]},
-        ...
-    ]
+    list2gcode が無いとき（docker の notebook は simulate/work だけをマウントする）の、
+    もとの svg.path + minidom 版。
+    順番は line → polyline → path、path は 1 本の曲線（サブパスもつなげたまま）。
     ※ path はベジエ、直線を含む複合パス → 適応サンプリングで細かく点列化
     """
 
@@ -82,7 +117,7 @@ def parse_svg(svg_path):
 
         pts = []
         for seg in path:  # path は複数セグメントの集合
-            pts.extend(sample_segment(seg, max_step=3.0))
+            pts.extend(sample_segment(seg, max_step=max_step))
 
         results.append({
             "type": "path",
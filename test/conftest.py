@@ -0,0 +1,25 @@
+# test/conftest.py
+# =========================================
+#  pytest 用：gcodegenerator のパッケージを import できるようにする
+#  （gcodegenerator/main.py と同じく list2gcode, camera を直下のパッケージとして読む）
+# =========================================
+import importlib.util
+import os
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "gcodegenerator"))
+
+# plot_full_arm などが matplotlib を import するので、ウィンドウを出さない
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+
+def load_module(name, path):
+    """
+    フォルダ名に括弧が入っていて普通に import できないモジュールを読む。
+    """
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -1,5 +1,8 @@
 import numpy as np
 import cv2
+from scipy import sparse
+from scipy.sparse.csgraph import depth_first_order
+from scipy.spatial import cKDTree
 
 # ---- 前処理 ----
 def preprocess(gray):
@@ -10,63 +13,109 @@ def preprocess(gray):
     return edges
 
 # ---- 連続線追跡 ----
-def trace_strokes(binary):
+_NEIGH_FWD = [(0,1),(1,-1),(1,0),(1,1)]   # 右・左下・下・右下（各辺を 1 回ずつ）
+
+def trace_strokes(binary, min_pixels=11):
+    """
+    8 近傍でつながった画素のかたまりを 1 本のストロークにする。
+    ラベル付けは connectedComponentsWithStats、画素の並びは
+    全かたまりをまとめた疎グラフの深さ優先順（画素ごとの Python ループなし）。
+    かたまりの順番・始点は従来どおりラスタ順で最初の画素。
+    """
+    n, labels, stats, _ = cv2.connectedComponentsWithStats(
+        (binary > 0).astype(np.uint8), connectivity=8)
+
+    keep = np.zeros(n, bool)
+    keep[1:] = stats[1:, cv2.CC_STAT_AREA] >= min_pixels
+    mask = keep[labels]
+
+    ys, xs = np.nonzero(mask)            # ラスタ順
+    m = len(ys)
+    if m == 0:
+        return []
+
     h, w = binary.shape
-    visited = np.zeros_like(binary, bool)
-    strokes = []
-    neigh = [(-1,-1),(-1,0),(-1,1),(0,-1),(0,1),(1,-1),(1,0),(1,1)]
+    index = np.full((h, w), -1, np.int64)
+    index[ys, xs] = np.arange(m)
+
+    rows, cols = [], []
+    for dy, dx in _NEIGH_FWD:
+        ny, nx = ys+dy, xs+dx
+        ok = (ny < h) & (nx >= 0) & (nx < w)
+        nb = np.full(m, -1, np.int64)
+        nb[ok] = index[ny[ok], nx[ok]]
+        has = nb >= 0
+        rows.append(np.flatnonzero(has))
+        cols.append(nb[has])
+
+    # 仮想の根 m から各かたまりの最初の画素へ辺を張り、1 回の DFS で全部たどる
+    lab = labels[ys, xs]
+    first_px = np.sort(np.unique(lab, return_index=True)[1])
+    rows.append(np.full(len(first_px), m))
+    cols.append(first_px)
+
+    rows = np.concatenate(rows)
+    cols = np.concatenate(cols)
+    g = sparse.coo_matrix((np.ones(len(rows), np.uint8), (rows, cols)), shape=(m+1, m+1))
+    g = (g + g.T).tocsr()
+    g.sort_indices()
+
+    order = depth_first_order(g, m, directed=False, return_predecessors=False)[1:]
+    splits = np.flatnonzero(np.diff(lab[order]) != 0) + 1
 
-    for y in range(h):
-        for x in range(w):
-            if binary[y,x]==0 or visited[y,x]: continue
-            stack=[(x,y)]
-            stroke=[]
-            while stack:
-                cx,cy=stack.pop()
-                if visited[cy,cx]: continue
-                visited[cy,cx]=True
-                stroke.append([cx,cy])
-                for dx,dy in neigh:
-                    nx,ny=cx+dx,cy+dy
-                    if 0<=nx<w and 0<=ny<h and binary[ny,nx]>0 and not visited[ny,nx]:
-                        stack.append((nx,ny))
-            if len(stroke)>10:
-                strokes.append(np.array(stroke,float))
-    return strokes
+    pts = np.column_stack([xs, ys]).astype(float)
+    return [pts[o] for o in np.split(order, splits)]
 
 # ---- 距離結合 ----
 def merge_strokes(strokes, th=10):
-    out=[]
-    used=[False]*len(strokes)
+    """
+    ストローク i の終点から th 未満に始点がある j（i より後ろ、番号順）を順に後ろへつなぐ。
+    始点の検索は KD-tree、結合は最後に 1 回だけ concatenate。
+    """
+    if not strokes:
+        return []
+    starts = np.array([s[0] for s in strokes])
+    tree = cKDTree(starts)
+    used = np.zeros(len(strokes), bool)
+    out = []
     for i in range(len(strokes)):
         if used[i]: continue
-        base=strokes[i].copy()
-        end=base[-1]
-        for j in range(len(strokes)):
-            if used[j] or i==j: continue
-            if np.linalg.norm(end-strokes[j][0])<th:
-                base=np.vstack([base,strokes[j]])
-                used[j]=True
-                end=base[-1]
-        out.append(base)
-        used[i]=True
+        used[i] = True
+        parts = [strokes[i]]
+        end = strokes[i][-1]
+        j = i
+        while True:
+            cand = np.array(tree.query_ball_point(end, th), dtype=int)
+            if len(cand):
+                cand = cand[(cand > j) & ~used[cand]]
+                cand = cand[np.linalg.norm(starts[cand]-end, axis=1) < th]
+            if len(cand) == 0: break
+            j = cand.min()
+            used[j] = True
+            parts.append(strokes[j])
+            end = strokes[j][-1]
+        out.append(np.concatenate(parts))
     return out
 
 # ---- 中心マージ ----
 def merge_by_center(strokes, dist=25):
-    centers=[np.mean(s,0) for s in strokes]
-    used=[False]*len(strokes)
-    merged=[]
+    """
+    ストローク i の重心から dist 未満に重心がある未使用のストロークをまとめる（KD-tree）。
+    """
+    if not strokes:
+        return []
+    centers = np.array([np.mean(s,0) for s in strokes])
+    tree = cKDTree(centers)
+    used = np.zeros(len(strokes), bool)
+    merged = []
     for i in range(len(strokes)):
         if used[i]: continue
-        big=strokes[i].copy()
-        for j in range(len(strokes)):
-            if used[j] or i==j: continue
-            if np.linalg.norm(centers[i]-centers[j])<dist:
-                big=np.vstack([big,strokes[j]])
-                used[j]=True
-        used[i]=True
-        merged.append(big)
+        used[i] = True
+        cand = np.array(tree.query_ball_point(centers[i], dist), dtype=int)
+        cand = np.sort(cand[~used[cand]])
+        cand = cand[np.linalg.norm(centers[cand]-centers[i], axis=1) < dist]
+        used[cand] = True
+        merged.append(np.concatenate([strokes[i]] + [strokes[j] for j in cand]))
     return merged
 
 # ---- パイプライン ----
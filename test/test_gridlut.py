@@ -0,0 +1,99 @@
+# test/test_gridlut.py
+# =========================================
+#  格子 LUT（lookup_grid_lut）が KD-tree の経路と同じ候補を返すかの確認
+# =========================================
+import numpy as np
+import pytest
+from scipy.spatial import cKDTree
+
+from list2gcode.lutcache import build_angle_table
+from list2gcode.makegcode import build_grid_lut, lookup_grid_lut, classify_reachable, radcheck_batch
+from list2gcode.processor import split_reachable_curves, genrad_kdtree
+
+MAX_ERROR_MM = 2.0
+K = 20
+
+
+@pytest.fixture(scope="module")
+def table():
+    return build_angle_table(angle_step=1.8)
+
+
+@pytest.fixture(scope="module")
+def grid(table):
+    return build_grid_lut(*table, cell_mm=1.0, max_error_mm=MAX_ERROR_MM)
+
+
+def _random_targets(xy, n, seed):
+    """LUT の点の近く（届く所・届かない所の境目も含む）にばらまく"""
+    rng = np.random.default_rng(seed)
+    base = xy[rng.integers(0, len(xy), n)]
+    return base + rng.uniform(-3.0, 3.0, (n, 2))
+
+
+def _kd_candidates(tree, theta_L, theta_R, pts):
+    """genrad_kdtree と同じ引き方：k=20 近傍のうち max_error_mm 以内"""
+    dists, idxs = tree.query(pts, k=K)
+    valid = dists <= MAX_ERROR_MM
+    safe = np.where(idxs < len(theta_L), idxs, 0)
+    return theta_L[safe], theta_R[safe], dists, valid
+
+
+def test_grid_matches_kdtree_candidates(table, grid):
+    theta_L, theta_R, xy = table
+    tree = cKDTree(xy)
+    pts = _random_targets(xy, 5000, seed=0)
+
+    gL, gR, gerr, gvalid = lookup_grid_lut(grid, pts, max_error_mm=MAX_ERROR_MM, k=K)
+    kL, kR, kerr, kvalid = _kd_candidates(tree, theta_L, theta_R, pts)
+
+    # 届く／届かないの判定が一致
+    np.testing.assert_array_equal(gvalid.any(axis=1), kvalid.any(axis=1))
+
+    # 有効な候補の数・誤差・角度が一致（どちらも誤差の小さい順）
+    np.testing.assert_array_equal(gvalid.sum(axis=1), kvalid.sum(axis=1))
+    np.testing.assert_allclose(np.where(gvalid, gerr, 0), np.where(kvalid, kerr, 0), atol=1e-9)
+    for n in np.flatnonzero(gvalid.any(axis=1)):
+        g = set(zip(gL[n, gvalid[n]], gR[n, gvalid[n]]))
+        k = set(zip(kL[n, kvalid[n]], kR[n, kvalid[n]]))
+        assert g == k
+
+
+def test_grid_outside_has_no_candidates(grid):
+    pts = np.array([[1e4, 1e4], [-1e4, 0.0]])
+    _, _, err, valid = lookup_grid_lut(grid, pts, max_error_mm=MAX_ERROR_MM, k=K)
+    assert not valid.any()
+    assert np.isinf(err).all()
+
+
+# =========================================
+#  到達可能判定（split_reachable_curves）と IK の一致
+# =========================================
+def test_classify_reachable_matches_kdtree(table, grid):
+    theta_L, theta_R, xy = table
+    tree = cKDTree(xy)
+    pts = _random_targets(xy, 5000, seed=1)
+
+    kL, kR, _, kvalid = _kd_candidates(tree, theta_L, theta_R, pts)
+    kvalid &= radcheck_batch(kL, kR)
+
+    got = classify_reachable(grid, pts, max_error_mm=MAX_ERROR_MM)
+    np.testing.assert_array_equal(got, kvalid.any(axis=1))
+
+
+def test_split_leaves_no_ik_failures(table, grid):
+    # 可動域の縁をまたいで出入りする曲線
+    rng = np.random.default_rng(2)
+    curves = [
+        {"curve_id": i + 1,
+         "points": [tuple(p) for p in np.cumsum(rng.normal(0, 4, (200, 2)), axis=0) + (0, 60)]}
+        for i in range(20)
+    ]
+    lut = dict(grid, path=None)
+
+    split = split_reachable_curves(curves, max_error_mm=MAX_ERROR_MM, lut=lut)
+    result = genrad_kdtree(split, max_error_mm=MAX_ERROR_MM, lut=lut)
+
+    n_kept = sum(len(c["points"]) for c in result)
+    assert 0 < n_kept < 20 * 200          # 届かない点はあったが、全部は捨てていない
+    assert all(p[2] is not None for c in result for p in c["points"])
@@ -0,0 +1,196 @@
+# test/test_parity.py
+# =========================================
+#  高速化した処理が、元（ベースライン）の素直な実装と同じ結果を返すかの確認
+#  参照実装は元のコードをそのまま写したもの（_ref_ で始まる関数）
+# =========================================
+import math
+
+import numpy as np
+import pytest
+
+from conftest import ROOT, load_module
+
+from list2gcode.makegcode import plot_full_arm, links_collide
+from list2gcode.lutcache import build_angle_table
+from list2gcode.processor import generate_rotandscale_curves
+from list2gcode.list2goodlist import simplify_curve, simplify_curve_list
+
+
+# =========================================
+#  角度表（rad2csv.generate_angle_csv のループ版）
+# =========================================
+def _ref_angle_table(angle_step=1.8, d=50):
+    """
+    元の generate_angle_csv の二重ループ。
+    LUT は後からリンク干渉チェックを足したので、その判定だけ最後に重ねる。
+    """
+    right_motor_x = d/2
+    left_motor_x = -d/2
+
+    rows = []
+    arms = []
+    for thL in np.arange(-180, 180 + 1e-6, angle_step):
+        for thR in np.arange(-180, 180 + 1e-6, angle_step):
+            result = plot_full_arm(thL, thR, l1=65, l2=85, d=d, offset=25, plot=False)
+            if result is None:
+                continue
+
+            P_tip, P, L_tip, R_tip = result
+            Lx, Ly = L_tip
+            Rx, Ry = R_tip
+            Px, Py = P
+
+            if not (Lx + 1 < Px < Rx - 1):
+                continue
+            if Ly < 20 and Ry < 20:
+                continue
+            if Lx > right_motor_x + 10 and Ly < -10:
+                continue
+            if Rx < left_motor_x - 10 and Ry < -10:
+                continue
+
+            rows.append([thL, thR, P_tip[0], P_tip[1]])
+            arms.append([P_tip, P, L_tip, R_tip])
+
+    rows = np.array(rows)
+    P_tip, P, L_tip, R_tip = (np.array(a) for a in zip(*arms))
+    return rows[~links_collide(P_tip, P, L_tip, R_tip, d=d)]
+
+
+def test_angle_table_matches_loop():
+    ref = _ref_angle_table()
+    thL, thR, xy = build_angle_table(angle_step=1.8)
+    got = np.column_stack([thL, thR, xy])
+
+    assert got.shape == ref.shape
+    np.testing.assert_allclose(got, ref, atol=1e-9)
+
+
+# =========================================
+#  回転 → 縮小 → Chaikin → モーター座標 → 平行移動 → 丸め
+# =========================================
+def _ref_rotandscale(curve_list, rotate_deg, box_w, box_h, offset_x, offset_y, ndigits):
+    """
+    元の generate_rotandscale_curves（曲線・点ごとのループ）。
+    """
+    rad = math.radians(rotate_deg)
+    R = np.array([[math.cos(rad), -math.sin(rad)],
+                  [math.sin(rad),  math.cos(rad)]])
+    rotated = [np.array(c["points"], dtype=float) @ R.T for c in curve_list]
+
+    all_pts = np.concatenate(rotated)
+    min_x, min_y = all_pts.min(axis=0)
+    W, H = all_pts.max(axis=0) - (min_x, min_y)
+    scale = min(box_w / W, box_h / H)
+    scaled = [[((x - min_x) * scale, (y - min_y) * scale) for x, y in pts] for pts in rotated]
+
+    out = []
+    for curve, pts in zip(curve_list, scaled):
+        for _ in range(2):
+            new_pts = []
+            for i in range(len(pts) - 1):
+                x1, y1 = pts[i]
+                x2, y2 = pts[i + 1]
+                new_pts.append((0.75*x1 + 0.25*x2, 0.75*y1 + 0.25*y2))
+                new_pts.append((0.25*x1 + 0.75*x2, 0.25*y1 + 0.75*y2))
+            pts = new_pts
+
+        pts = [(x + offset_x, abs(100 - y) + offset_y) for x, y in pts]
+        out.append({
+            "curve_id": curve["curve_id"],
+            "points": [(round(x, ndigits), round(y, ndigits)) for x, y in pts],
+        })
+    return out
+
+
+def test_rotandscale_matches_loop():
+    rng = np.random.default_rng(0)
+    curve_list = [
+        {"curve_id": i + 1,
+         "points": [tuple(p) for p in np.cumsum(rng.normal(0, 8, (n, 2)), axis=0) + 500]}
+        for i, n in enumerate(rng.integers(2, 60, 25))
+    ]
+    kw = dict(rotate_deg=90, box_w=148, box_h=100, offset_x=-74, offset_y=40)
+
+    ref = _ref_rotandscale(curve_list, ndigits=3, **kw)
+    got = generate_rotandscale_curves(curve_list, decimal_digits=3, **kw)
+
+    assert [c["curve_id"] for c in got] == [c["curve_id"] for c in ref]
+    for g, r in zip(got, ref):
+        # 行列を 1 つにまとめた分の丸め誤差で、3 桁目が 1 つずれることはある
+        np.testing.assert_allclose(np.array(g["points"]), np.array(r["points"]), atol=1.5e-3)
+
+
+# =========================================
+#  RDP 重要度による簡略化（全曲線まとめて 1 回 ↔ 曲線ごと）
+# =========================================
+def test_simplify_curve_list_matches_per_curve():
+    rng = np.random.default_rng(3)
+    curve_list = [
+        {"curve_id": i, "points": np.round(np.cumsum(rng.normal(0, 3, (n, 2)), axis=0))}
+        for i, n in enumerate(rng.integers(0, 400, 60))
+    ]
+    # 同じ重要度の点が並ぶ（直線の往復）曲線も入れる
+    curve_list.append({"curve_id": 99, "points": [(0, 0), (1, 0), (2, 0), (3, 0)] * 30})
+
+    got = simplify_curve_list(curve_list, target_points=50)
+
+    assert [c["curve_id"] for c in got] == [c["curve_id"] for c in curve_list]
+    for g, c in zip(got, curve_list):
+        ref = np.array(simplify_curve(c["points"], target_points=50)).reshape(-1, 2)
+        np.testing.assert_array_equal(np.array(g["points"]).reshape(-1, 2), ref)
+
+
+# =========================================
+#  trace_strokes（画素ごとの DFS 版）
+# =========================================
+def _ref_trace_strokes(binary):
+    h, w = binary.shape
+    visited = np.zeros_like(binary, bool)
+    strokes = []
+    neigh = [(-1,-1),(-1,0),(-1,1),(0,-1),(0,1),(1,-1),(1,0),(1,1)]
+
+    for y in range(h):
+        for x in range(w):
+            if binary[y,x]==0 or visited[y,x]: continue
+            stack=[(x,y)]
+            stroke=[]
+            while stack:
+                cx,cy=stack.pop()
+                if visited[cy,cx]: continue
+                visited[cy,cx]=True
+                stroke.append([cx,cy])
+                for dx,dy in neigh:
+                    nx,ny=cx+dx,cy+dy
+                    if 0<=nx<w and 0<=ny<h and binary[ny,nx]>0 and not visited[ny,nx]:
+                        stack.append((nx,ny))
+            if len(stroke)>10:
+                strokes.append(np.array(stroke,float))
+    return strokes
+
+
+@pytest.fixture(scope="module")
+def strokes_lib():
+    pytest.importorskip("cv2")
+    path = ROOT / "test" / "test(camera)" / "test(makelistdontusesvg)" / "library.py"
+    return load_module("makelist_library", path)
+
+
+def test_trace_strokes_matches_loop(strokes_lib):
+    rng = np.random.default_rng(1)
+    binary = np.zeros((120, 160), np.uint8)
+    for _ in range(40):
+        y, x = rng.integers(0, 120), rng.integers(0, 160)
+        dy, dx = rng.integers(-1, 2, 2)
+        for _ in range(rng.integers(3, 40)):
+            binary[y % 120, x % 160] = 255
+            y, x = y + dy + rng.integers(-1, 2), x + dx + rng.integers(-1, 2)
+
+    ref = _ref_trace_strokes(binary)
+    got = strokes_lib.trace_strokes(binary)
+
+    assert len(got) == len(ref)
+    for g, r in zip(got, ref):
+        # かたまりと始点は同じ。DFS の枝の順は違ってよい
+        np.testing.assert_array_equal(g[0], r[0])
+        assert set(map(tuple, g)) == set(map(tuple, r))
@@ -0,0 +1,68 @@
+# test/test_skeleton.py
+# =========================================
+#  細線化（skeletonize）と一筆書き（skeleton_strokes）が骨格の上を通るかの確認
+# =========================================
+import numpy as np
+import pytest
+
+from conftest import ROOT
+
+cv2 = pytest.importorskip("cv2")
+if not hasattr(cv2, "CascadeClassifier"):
+    pytest.skip("camera.library は顔検出（cv2.CascadeClassifier）を読み込み時に使う",
+                allow_module_level=True)
+
+from camera.library import skeletonize, skeleton_strokes
+
+
+def _binary(path):
+    img = cv2.imread(str(path), cv2.IMREAD_GRAYSCALE)
+    _, th = cv2.threshold(img, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return th == 0
+
+
+def _synthetic():
+    """交差・T 字・太い斜め線（階段が残りやすい）・輪"""
+    img = np.zeros((160, 200), np.uint8)
+    cv2.line(img, (10, 10), (190, 150), 255, 4)
+    cv2.line(img, (10, 150), (190, 10), 255, 3)
+    cv2.line(img, (100, 20), (100, 80), 255, 5)
+    cv2.line(img, (20, 80), (80, 95), 255, 2)
+    cv2.circle(img, (150, 110), 25, 255, 3)
+    return img > 0
+
+
+@pytest.fixture(params=["synthetic", "photo"])
+def skel(request):
+    if request.param == "synthetic":
+        return skeletonize(_synthetic())
+    return skeletonize(_binary(ROOT / "test" / "test(camera)" / "line_output_dualcontrol.jpg"))
+
+
+def test_skeleton_has_no_staircase_corners(skel):
+    # N と E があり W・SW・S が空の画素（4 方向とも）は残っていない
+    img = np.pad(skel, 1)
+    for k in range(4):
+        r = np.rot90(img, k)
+        c = r[1:-1, 1:-1]
+        n, e = r[:-2, 1:-1], r[1:-1, 2:]
+        w, sw, s = r[1:-1, :-2], r[2:, :-2], r[2:, 1:-1]
+        assert not (c & n & e & ~w & ~sw & ~s).any()
+
+
+def test_strokes_stay_on_skeleton(skel):
+    strokes = skeleton_strokes(skel, min_points=1)
+    pts = np.vstack(strokes)
+
+    # 骨格からの距離は 0 か 1 画素
+    dist = cv2.distanceTransform((~skel).astype(np.uint8), cv2.DIST_L2, 3)
+    assert dist[pts[:, 1], pts[:, 0]].max() <= 1
+
+    # 一筆書きの中で飛ばない（続く点は 8 近傍）
+    for s in strokes:
+        assert np.abs(np.diff(s, axis=0)).max(initial=0) <= 1
+
+    # 骨格の画素は全部どこかの一筆書きに入る
+    covered = np.zeros_like(skel)
+    covered[pts[:, 1], pts[:, 0]] = True
+    assert not (skel & ~covered).any()
@@ -0,0 +1,96 @@
+# test/test_svgsource.py
+# =========================================
+#  SVG 読み込み（svgsource）が svg.path で分割していたときと同じ点を返すかの確認
+# =========================================
+import sys
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import pytest
+
+from conftest import ROOT, load_module
+
+from list2gcode.svgsource import sample_path, iter_svg_curves
+
+svg_path = pytest.importorskip("svg.path")
+
+SVG = ROOT / "simulate" / "work" / "makegcode" / "line_raw2.svg"
+
+# 円弧（大円弧・向き・回転・半径不足）、相対コマンド、暗黙の繰り返し、S / T、H / V、Z、m のサブパス
+HANDMADE = [
+    "M10 10 A30 20 30 0 1 80 60 a25 25 0 1 0 -40 10 A5 8 -45 1 1 90 95 Z",
+    "M0 0 a10 10 0 0 1 20 0 10 10 0 0 1 20 0 a1 1 0 0 0 30 0",
+    "M0 0 Q50 80 100 0 T200 0 t50 40 S300 100 320 0 s20 -30 40 0 "
+    "C400 0 410 50 420 10 h-30 v20 H0 V5 z m5 5 l20 0 20 20",
+    "m5,5c10-10,20-10,30,0-5.5.5e1,1e1 3 20-4l1,2,3,4",
+]
+
+
+def _ref_sample_path(d, max_step=3.0):
+    """
+    元の parse_svg の分割（svg.path の seg.length() / seg.point()）。
+    区間の継ぎ目の重複点は落とし、M ごとに別の曲線にしたもの。
+    """
+    curves = []
+    for seg in svg_path.parse_path(d):
+        if isinstance(seg, svg_path.Move):
+            curves.append([(seg.end.real, seg.end.imag)])
+            continue
+        if isinstance(seg, svg_path.Close) and seg.start == seg.end:
+            continue
+        num = max(2, int(seg.length() / max_step))
+        curves[-1].extend((p.real, p.imag) for p in (seg.point(i / num) for i in range(1, num + 1)))
+    return [np.array(c) for c in curves]
+
+
+def _real_paths(limit=20, max_chars=1000):
+    """potrace の出力（相対 c / l の暗黙の繰り返し、m のサブパス）。svg.path が遅いので短いものだけ"""
+    ds = [e.get("d") for e in ET.parse(SVG).iter() if e.tag.endswith("path")]
+    return [d for d in ds if len(d) <= max_chars][:limit]
+
+
+@pytest.mark.parametrize("d", HANDMADE + _real_paths())
+def test_sample_path_matches_svg_path(d):
+    ref = _ref_sample_path(d)
+    got = sample_path(d)
+
+    assert [len(c) for c in got] == [len(c) for c in ref]
+    for g, r in zip(got, ref):
+        np.testing.assert_allclose(g, r, atol=1e-6)
+
+
+def test_parse_svg_uses_svgsource():
+    pytest.importorskip("cv2")
+    svg2list = load_module("svg2list", ROOT / "simulate" / "work" / "makegcode" / "svg2list.py")
+
+    data = svg2list.parse_svg(SVG)
+    curves = list(iter_svg_curves(SVG))
+
+    assert [c["type"] for c in data] == ["path"] * len(curves)
+    for item, c in zip(data, curves):
+        np.testing.assert_array_equal(np.array(item["points"]), c["points"])
+
+
+def test_parse_svg_falls_back_without_list2gcode(tmp_path, monkeypatch):
+    # docker の notebook（simulate/work だけ）では list2gcode が import できない
+    pytest.importorskip("cv2")
+    monkeypatch.setitem(sys.modules, "list2gcode.svgsource", None)
+    svg2list = load_module("svg2list_fallback", ROOT / "simulate" / "work" / "makegcode" / "svg2list.py")
+    assert svg2list.iter_svg_curves is None
+
+    d = HANDMADE[0]
+    svg = tmp_path / "mixed.svg"
+    svg.write_text(
+        '<svg xmlns="http://www.w3.org/2000/svg">'
+        f'<path d="{d}"/><polyline points="0,0 5,5 9,1"/><line x1="1" y1="2" x2="3" y2="4"/>'
+        '</svg>'
+    )
+    data = svg2list.parse_svg(str(svg))
+
+    # もとの順番（line → polyline → path）
+    assert [c["type"] for c in data] == ["line", "polyline", "path"]
+
+    # 区間の継ぎ目の重複点を除けば svgsource と同じ点
+    pts = np.array(data[2]["points"])
+    pts = pts[np.r_[True, np.abs(np.diff(pts, axis=0)).max(axis=1) > 1e-6]]
+    np.testing.assert_allclose(pts, sample_path(d)[0], atol=1e-6)
@@ -0,0 +1,47 @@
+# test/test_tsp.py
+# =========================================
+#  曲線の描画順（tsp_order_directed）の確認
+# =========================================
+import numpy as np
+
+from list2gcode.list2goodlist import (
+    tsp_order_directed,
+    _nearest_neighbor_tour,
+    _tour_cost,
+)
+
+
+def _random_curves(n, seed):
+    rng = np.random.default_rng(seed)
+    entries = rng.uniform(0, 100, (n, 2))
+    exits = entries + rng.normal(0, 10, (n, 2))
+    return entries, exits
+
+
+def test_tsp_is_deterministic():
+    entries, exits = _random_curves(150, seed=0)
+    a = tsp_order_directed(entries, exits)
+    b = tsp_order_directed(entries, exits)
+    np.testing.assert_array_equal(a[0], b[0])
+    np.testing.assert_array_equal(a[1], b[1])
+
+
+def test_tsp_improves_on_nearest_neighbor():
+    entries, exits = _random_curves(150, seed=1)
+
+    nn_order, nn_flip = _nearest_neighbor_tour(entries, exits, True, "euclid")
+    order, flip = tsp_order_directed(entries, exits)
+
+    # 全曲線を 1 回ずつ
+    assert sorted(order.tolist()) == list(range(150))
+    assert order[0] == 0
+    assert (_tour_cost(entries, exits, order, flip, "euclid")
+            < _tour_cost(entries, exits, nn_order, nn_flip, "euclid"))
+
+
+def test_tsp_zero_rounds_is_nearest_neighbor():
+    entries, exits = _random_curves(40, seed=2)
+    nn_order, nn_flip = _nearest_neighbor_tour(entries, exits, True, "euclid")
+    order, flip = tsp_order_directed(entries, exits, max_rounds=0)
+    np.testing.assert_array_equal(order, nn_order)
+    np.testing.assert_array_equal(flip, nn_flip)
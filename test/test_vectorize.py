@@ -0,0 +1,38 @@
+# test/test_vectorize.py
+# =========================================
+#  vectorize_curves（結合 + RDP 簡略化）の確認
+# =========================================
+import numpy as np
+
+from list2gcode.curveset import CurveSet
+from list2gcode.list2goodlist import rdp_significance
+from list2gcode.processor import vectorize_curves
+
+
+def test_vectorize_matches_per_curve_rdp():
+    rng = np.random.default_rng(0)
+    # 端点が離れているので結合はされない
+    curve_list = [
+        {"curve_id": i + 1,
+         "points": np.round(np.cumsum(rng.normal(0, 2, (n, 2)), axis=0)) + 100 * i}
+        for i, n in enumerate(rng.integers(2, 200, 20))
+    ]
+
+    got = vectorize_curves(curve_list, merge_tol=0.5, simplify_tol=1.0)
+
+    assert len(got) == len(curve_list)
+    for g, c in zip(got, curve_list):
+        pts = np.asarray(c["points"], dtype=float)
+        np.testing.assert_array_equal(g["points"], pts[rdp_significance(pts) >= 1.0])
+
+
+def test_vectorize_empty():
+    empty = CurveSet.from_arrays([])
+    got = vectorize_curves(empty, simplify_tol=0.5)
+    assert len(got) == 0
+    np.testing.assert_array_equal(got.offsets, [0])
+
+    # 空の曲線が混じっても offsets がずれない
+    curves = CurveSet.from_arrays([np.zeros((0, 2)), [(0, 0), (1, 0.1), (2, 0)], np.zeros((0, 2))])
+    got = vectorize_curves(curves, merge_tol=0.0, simplify_tol=0.5)
+    np.testing.assert_array_equal(got.offsets, [0, 0, 2, 2])